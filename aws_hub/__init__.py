@@ -0,0 +1,2 @@
+# aws_hub generates eksctl nodegroups and JupyterHub profiles for EC2 instances
+# heavy dependencies (boto3, botocore, PyYAML) are imported only when they are used
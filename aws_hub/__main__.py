@@ -0,0 +1,3 @@
+from .aws_hub import main
+
+main()
@@ -1,12 +1,18 @@
-#!/usr/bin/env python3
-
 # should read / take in configuration and be able to spit out profile list for JupyterHub
 # and configuration files for eksctl
 # can use ec2_instance_information.py to get all instance types etc. within a region
-from ec2_instance_information import get_all_instance_information_for_region
-from utils import load_yaml, load_yaml_from_file, dump_yaml, recursive_dict_copy, recursive_rename_values_in_object
+from .ec2_instance_information import get_all_instance_information_for_region, save_region_information, load_region_information, get_spot_operating_system_description
+from .price_store import priceStore
+from .instance_selector import instanceSelector
+from .utils import load_yaml, load_yaml_from_file, dump_yaml, recursive_dict_copy, recursive_rename_values_in_object, parse_memory_gib, parse_instance_storage, get_processor_architecture, is_burstable_instance
+from .profiles import make_profile, apply_profile_defaults, format_profile, make_profile_list_snippet, node_affinity_matches
+from .benchmarks import load_benchmarks, compute_perf_per_dollar
+from .warm_capacity import load_usage_history, plan_warm_capacity, make_scaling_schedule, apply_scaling_schedule
 import json
 import argparse
+import re
+import os
+import time
 from copy import deepcopy
 import sys
 
@@ -17,90 +23,75 @@ import sys
 #   display warnings for availability zone conflicts
 # - make eksctl file/profile list from reduced data
 
-def make_profile_list(instance_information):
-    # display name
-    # description (from hardware information)
-    # family (from instance name)
-    # category (from hardware)
-    # kubespawner_override: from node taints in configuration
-    # cpu_limit / mem_limit: from hardware information
-    # extra_resource_limits: if gpu, nvidia.com/gpu
-
+# only the instances in instance_store_scratch_instances get the scratch volume
+def make_profile_list(instance_information, instance_store_scratch_instances=()):
     profile_list = []
 
     for instance_name, instance_info in instance_information.items():
-        on_demand_pricing = instance_info['on_demand_pricing']
-        hardware = instance_info['hardware']
-        display_name = instance_name.replace(".", "-")
-        family = instance_name.split(".")[0].upper()
-        category = hardware['instanceFamily']
-        cpu_str = hardware['vcpu']
-        mem_str = hardware['memory']
-        storage = hardware['storage']
-        gpu = hardware['gpu']
-        network_performance = hardware['networkPerformance']
-
-        if gpu:
-            description = "{} CPU, {} RAM, {} GPU".format(cpu_str, mem_str, gpu)
-        else:
-            description = "{} CPU, {} RAM".format(cpu_str, mem_str)
-        
-        on_demand_price = float(on_demand_pricing['price'])
-        if on_demand_price > 0.01:
-            on_demand_price_str = "${:.2f}/hour".format(on_demand_price)
-        else:
-            on_demand_price_str = "${:.3f}/hour".format(on_demand_price)
-
-        profile = {}
-        profile['display_name'] = display_name
-        profile['family'] = family
-        profile['category'] = category
-        profile['description'] = description
-
-        aws = {}
-        aws['instance_size'] = display_name.split("-")[-1]
-        aws['price'] = on_demand_price
-        aws['price_description'] = on_demand_price_str
-        aws['network'] = network_performance
-        aws['cpu'] = cpu_str
-        aws['memory'] = mem_str
-        aws['storage'] = storage
-        aws['gpu'] = gpu
-        profile['aws'] = aws
-        
-        kubespawner_override = {}
-        cpu_limit = float(cpu_str)
-        cpu_undershoot_ratio = 0.9
-        cpu_guarantee = float("{:.1f}".format(float(cpu_str) * cpu_undershoot_ratio))
-        cpu_guarantee = float("{:.1f}".format(cpu_limit - 0.5))
-        mem_gib = mem_str.split(" ")[0].replace(",", "")
-        # GiB = 2^30 bytes, GB = 10^9 bytes
-        gib_to_gb = 1e9 / (2**30)
-        mem_gb = float(mem_gib) * gib_to_gb
-        mem_undershoot_ratio = 0.9
-        mem_limit = "{}M".format(int(1e3 * mem_gb * mem_undershoot_ratio))
-        mem_guarantee = "{}M".format(int(1e3 * mem_gb * mem_undershoot_ratio))
-        kubespawner_override['cpu_limit'] = cpu_limit
-        kubespawner_override['cpu_guarantee'] = cpu_guarantee
-        kubespawner_override['mem_limit'] = mem_limit
-        kubespawner_override['mem_guarantee'] = mem_guarantee
-        extra_resource_limits = {}
-        if gpu:
-            extra_resource_limits['nvidia.com/gpu'] = gpu
-        else:
-            extra_resource_limits['nvidia.com/gpu'] = '0'
-        kubespawner_override['extra_resource_limits'] = extra_resource_limits
-
-        profile['kubespawner_override'] = kubespawner_override
-
-        profile_list.append(profile)
+        instance_store_scratch = instance_name in instance_store_scratch_instances
+        profile_list.append(make_profile(instance_name, instance_info, instance_store_scratch=instance_store_scratch))
     
     return profile_list
 
+# whether an instance with candidate_storage can stand in for one with storage in a nodegroup:
+# both have NVMe instance storage with at least as much space on the candidate, or neither has any
+def instance_storage_substitutes(candidate_storage, storage):
+    candidate_instance_storage = parse_instance_storage(candidate_storage)
+    instance_storage = parse_instance_storage(storage)
+    if not candidate_instance_storage or not instance_storage:
+        return not candidate_instance_storage and not instance_storage
+    return candidate_instance_storage[1] >= instance_storage[1]
+
+# shell commands for a nodegroup's preBootstrapCommands that stripe (RAID-0) the
+# NVMe instance store disks, format and mount them, and put the kubelet's pod
+# directory (and with it emptyDir volumes) on them
+def instance_store_scratch_command(num_disks):
+    command = [
+        "DEVICES=$(for DEVICE in /dev/disk/by-id/nvme-Amazon_EC2_NVMe_Instance_Storage_*; do readlink -f $DEVICE; done | sort -u)",
+    ]
+    if num_disks > 1:
+        command += [
+            "yum install -y mdadm",
+            "mdadm --create /dev/md0 --run --level=0 --raid-devices=$(echo $DEVICES | wc -w) $DEVICES",
+            "SCRATCH_DEVICE=/dev/md0",
+        ]
+    else:
+        command += [
+            "SCRATCH_DEVICE=$(echo $DEVICES | cut -d ' ' -f 1)",
+        ]
+    command += [
+        "mkfs.xfs -f $SCRATCH_DEVICE",
+        "mkdir -p /mnt/scratch",
+        "mount -o noatime $SCRATCH_DEVICE /mnt/scratch",
+        "mkdir -p /mnt/scratch/kubelet-pods /var/lib/kubelet/pods",
+        "mount --bind /mnt/scratch/kubelet-pods /var/lib/kubelet/pods",
+    ]
+    return "\n".join(command)
+
+# where the profile catalog ConfigMap is mounted in the hub (see the aws-hub chart)
+profile_catalog_file = "/etc/aws-hub-profile-catalog/catalog.json"
+
 def make_eksctl_file():
     # see nodegroups.py
     pass
 
+def get_region_information(region, catalog=None, price_store=None):
+    if catalog and os.path.exists(catalog):
+        print(f"INFO: Loading instance information for {region} from {catalog}.", file=sys.stderr)
+        return load_region_information(catalog)
+
+    region_information = get_all_instance_information_for_region(region, price_store=price_store)
+    if catalog:
+        save_region_information(region_information, catalog)
+    return region_information
+
+# parses a range given as MIN:MAX, MIN: or :MAX (a single number is a minimum)
+def parse_range(range_str):
+    if ":" not in range_str:
+        return (float(range_str), None)
+    minimum, maximum = range_str.split(":", 1)
+    return (float(minimum) if minimum else None, float(maximum) if maximum else None)
+
 class hubFactory():
     default_config = { 
         'region' : 'us-west-2', 
@@ -108,6 +99,37 @@ class hubFactory():
         'operatingSystem' : "Linux",
         'clusterName' : 'eks-cluster',
         'overPayBy' : 0,
+        # a JSON file caching the instance information for the region
+        'catalog' : None,
+        'warmCapacity' : {},
+        'priorityExpander' : False,
+        # a file of benchmark scores per instance type used to compute performance per dollar
+        'benchmarks' : None,
+        # the benchmark metric profiles are sorted and highlighted by
+        'benchmarkMetric' : 'cpu',
+        # the largest number of nodegroups (CloudFormation stacks) in one eksctl shard file
+        'maxNodegroupsPerShard' : 20,
+        # build the profile list in the hub from a compact catalog instead of Helm values
+        'dynamicProfiles' : False,
+        # stripe, format and mount NVMe instance storage and give notebooks scratch space on it
+        'instanceStoreScratch' : True,
+        # a SQLite file keeping price observations across runs
+        'priceStore' : None,
+        # the windowed statistic of the stored Spot prices used for maxPrice (p95, max,
+        # mean or volatility for mean plus two standard deviations), None for the current prices
+        'spotMaxPriceStatistic' : None,
+        # days of stored Spot prices the statistic is computed over
+        'spotPriceWindow' : 7,
+        # display name patterns allowed per user / group with dynamicProfiles, e.g.
+        # { 'groups' : { 'gpu-users' : ['p3-*', 'g4dn-*'] }, 'users' : { 'alice' : ['*'] }, 'restricted' : False }
+        'profileFilters' : {},
+    }
+    default_warm_capacity = {
+        'usageHistory' : None,
+        # dollars per day to spend on keeping nodes warm
+        'budget' : 0,
+        'minSpawnsPerHour' : 1,
+        'maxWarmNodes' : 1,
     }
     default_group = {
         'families' : None,
@@ -117,6 +139,14 @@ class hubFactory():
         'separateInstances' : False,
         'separateFamilies' : False,
         'nodegroupOverrides' : {},
+        # diversify Spot nodegroups with instances of the same shape from other families
+        'spotDiversification' : False,
+        # substitutes must be within this percentage of the on-demand price
+        'spotPriceBand' : 20,
+        'spotMaxInstanceTypes' : 10,
+        # allow burstable (t2, t3, ...) instances as substitutes
+        'spotBurstableSubstitutes' : False,
+        'spotAllocationStrategy' : 'capacity-optimized',
     }
     default_hub_config = {
         
@@ -129,14 +159,23 @@ class hubFactory():
     instance_availability = None
     hub_config = None
     eksctl_config = None
+    eksctl_shards = None
     processed_nodegroups = None
+    spot_pool_depths = None
+    instance_store_scratch_instances = None
+    price_store = None
+    instances_without_price_statistics = None
+    warm_capacity_schedule = None
 
     def __init__(self):
-        pass
+        self.instances_without_price_statistics = set()
+        self.instance_store_scratch_instances = set()
     
     def query_region_information(self):
         region = self.config['region']
-        region_information = get_all_instance_information_for_region(region)
+        if self.config['priceStore'] and not self.price_store:
+            self.price_store = priceStore(self.config['priceStore'])
+        region_information = get_region_information(region, self.config['catalog'], price_store=self.price_store)
         self.region_information = region_information
 
         instance_availability = {}
@@ -333,11 +372,19 @@ class hubFactory():
                 instances_distribution['onDemandPercentageAboveBaseCapacity'] = 0
 
             instances_distribution['instanceTypes'] = group['instances']
+
+            if group['spotDiversification']:
+                substitutes = self.find_spot_substitutes(group)
+                instances_distribution['instanceTypes'] = group['instances'] + substitutes
+                instances_distribution['spotAllocationStrategy'] = group['spotAllocationStrategy']
+                # eksctl only accepts spotInstancePools with the lowest-price strategy
+                if group['spotAllocationStrategy'] == 'lowest-price':
+                    instances_distribution['spotInstancePools'] = min(len(instances_distribution['instanceTypes']), 20)
             
             # find maximum price among the Spot prices of all instances in this group
             max_prices = []
-            for instance in group['instances']:
-                max_prices.append(self.region_information[instance]['spot_pricing']['maxPrice'])
+            for instance in instances_distribution['instanceTypes']:
+                max_prices.append(self.get_spot_max_price(instance, group['availabilityZones']))
             max_price = max(max_prices)
             # set maximum price and over pay by a bit
             instances_distribution['maxPrice'] = max_price * (1. + self.config['overPayBy']/100)
@@ -345,14 +392,14 @@ class hubFactory():
             # hack to get around spot instances with only 1 instance in its group
             # include the most expensive instance in its family and keep the max price
             # the same so that the expensive one is never scheduled
-            if len(group['instances']) == 1:
+            if len(instances_distribution['instanceTypes']) == 1:
                 family_prices = []
                 for instance, instance_information in self.region_information.items():
                     instance_family = instance.split(".")[0]
                     group_family = group['instances'][0].split(".")[0]
                     same_family = instance_family == group_family
                     if same_family:
-                        family_prices.append((instance, self.region_information[instance]['spot_pricing']['maxPrice']))
+                        family_prices.append((instance, self.get_spot_max_price(instance, group['availabilityZones'])))
 
                 most_expensive_in_family = sorted(family_prices, key=lambda x : x[1], reverse=True)[0]
                 most_expensive_in_family_instance_name = most_expensive_in_family[0]
@@ -368,6 +415,100 @@ class hubFactory():
 
         return nodegroup
 
+    # the Spot price a nodegroup's maxPrice is based on, either the highest current
+    # price in the region or a windowed statistic from the price store
+    def get_spot_max_price(self, instance, availability_zones):
+        max_price = self.region_information[instance]['spot_pricing']['maxPrice']
+        statistic = self.config['spotMaxPriceStatistic']
+        if not statistic:
+            return max_price
+        if not self.price_store:
+            raise Exception("Configuration invalid. spotMaxPriceStatistic requires a priceStore.")
+        if statistic not in ['p95', 'max', 'mean', 'volatility']:
+            raise Exception(f"Configuration invalid. spotMaxPriceStatistic '{statistic}' must be one of p95, max, mean or volatility.")
+
+        now = time.time()
+        operating_system = get_spot_operating_system_description(self.config['operatingSystem'])
+        statistic_prices = []
+        for az in availability_zones:
+            statistics = self.price_store.get_spot_price_statistics(instance, az, operating_system, self.config['spotPriceWindow'], now)
+            if not statistics:
+                continue
+            if statistic == 'volatility':
+                statistic_prices.append(statistics['mean'] + 2 * statistics['volatility'])
+            else:
+                statistic_prices.append(statistics[statistic])
+
+        if len(statistic_prices) == 0:
+            if instance not in self.instances_without_price_statistics:
+                print(f"WARNING: no stored Spot prices for {instance}, using the current price.", file=sys.stderr)
+                self.instances_without_price_statistics.add(instance)
+            return max_price
+        return max(statistic_prices)
+
+    # finds instances of the same shape (vCPU, memory and CPU architecture) as those
+    # in the group priced within the group's price band and available as Spot instances
+    # in all of the group's availability zones
+    def find_spot_substitutes(self, group):
+        price_band = group['spotPriceBand'] / 100
+        candidates = []
+        for instance in group['instances']:
+            hardware = self.region_information[instance]['hardware']
+            on_demand_price = float(self.region_information[instance]['on_demand_pricing']['price'])
+            for candidate, candidate_information in self.region_information.items():
+                if candidate in group['instances']:
+                    continue
+                if 'hardware' not in candidate_information.keys() or 'on_demand_pricing' not in candidate_information.keys():
+                    continue
+                if 'maxPrice' not in candidate_information['spot_pricing'].keys():
+                    continue
+                candidate_hardware = candidate_information['hardware']
+                if candidate_hardware['vcpu'] != hardware['vcpu'] or candidate_hardware['gpu'] != hardware['gpu']:
+                    continue
+                if parse_memory_gib(candidate_hardware['memory']) != parse_memory_gib(hardware['memory']):
+                    continue
+                # the nodegroup's AMI and the users' images are built for one architecture
+                architecture = get_processor_architecture(hardware.get('physicalProcessor'))
+                if architecture is None or get_processor_architecture(candidate_hardware.get('physicalProcessor')) != architecture:
+                    continue
+                if is_burstable_instance(candidate) and not group['spotBurstableSubstitutes']:
+                    continue
+                # the nodegroup only mounts scratch space if every instance type has NVMe storage,
+                # and the profile's scratch size limit comes from the nodegroup's first instance type
+                if not instance_storage_substitutes(candidate_hardware['storage'], hardware['storage']):
+                    continue
+                candidate_price = float(candidate_information['on_demand_pricing']['price'])
+                if abs(candidate_price - on_demand_price) > price_band * on_demand_price:
+                    continue
+                if not all([az in self.instance_availability[candidate] for az in group['availabilityZones']]):
+                    continue
+                candidates.append((abs(candidate_price - on_demand_price), candidate))
+
+        # closest in price first
+        substitutes = []
+        for _, candidate in sorted(candidates):
+            if len(group['instances']) + len(substitutes) >= group['spotMaxInstanceTypes']:
+                break
+            if candidate not in substitutes:
+                substitutes.append(candidate)
+        
+        return substitutes
+
+    # the number of Spot capacity pools (instance type and availability zone pairs) the nodegroup can draw from
+    def get_spot_pool_depth(self, nodegroup):
+        return len(self.get_spot_pools(nodegroup))
+
+    # the (instance type, availability zone, price) Spot capacity pools a nodegroup can launch from
+    def get_spot_pools(self, nodegroup):
+        pools = []
+        for instance in nodegroup['instancesDistribution']['instanceTypes']:
+            spot_pricing = self.region_information[instance]['spot_pricing']
+            # the padding instance priced above maxPrice never launches
+            if spot_pricing.get('maxPrice', 0) > nodegroup['instancesDistribution']['maxPrice']:
+                continue
+            pools += [(instance, az, spot_pricing[az]) for az in nodegroup['availabilityZones'] if spot_pricing.get(az)]
+        return pools
+
     def set_hub_instances(self, instances):
         if self.region_information:
             self.hub_instances = {instance : self.region_information[instance] for instance in instances}
@@ -409,6 +550,9 @@ class hubFactory():
         groups = self.separate_availability_zones(groups)
 
         processed_groups = []
+        self.spot_pool_depths = {}
+        # instance -> whether every nodegroup of the instance mounts the NVMe scratch space
+        instance_store_scratch = {}
         for group in groups:
             if group['type'] == 'onDemand':
                 on_demand_configuration = self.create_on_demand_configuration(group)
@@ -422,43 +566,250 @@ class hubFactory():
                     print("WANRING: " + str(e), file=sys.stderr)
                     continue
                 formatted_configuration = self.format_nodegroup(spot_configuration)
+                pool_depth = self.get_spot_pool_depth(formatted_configuration)
+                self.spot_pool_depths[formatted_configuration['name']] = pool_depth
+                print(f"INFO: Spot nodegroup {formatted_configuration['name']} has an expected pool depth of {pool_depth}.", file=sys.stderr)
             else:
                 raise Exception("'type' : '{group['type']}' is invalid")
+            mounted = False
+            if self.config['instanceStoreScratch']:
+                scratch_configuration = self.add_instance_store_scratch(formatted_configuration)
+                mounted = scratch_configuration is not formatted_configuration
+                formatted_configuration = scratch_configuration
+            instance = self.get_nodegroup_instance(formatted_configuration)
+            instance_store_scratch[instance] = instance_store_scratch.get(instance, True) and mounted
             processed_groups.append(formatted_configuration)
+
+        # profiles only get the scratch volume if the nodes they can land on have it
+        self.instance_store_scratch_instances = set([instance for instance, mounted in instance_store_scratch.items() if mounted])
+
+        # eksctl, the warm capacity schedule and the priority expander all refer to nodegroups by name
+        nodegroup_names = [nodegroup.get('name') for nodegroup in processed_groups]
+        duplicate_names = sorted(set([name for name in nodegroup_names if nodegroup_names.count(name) > 1]))
+        if len(duplicate_names) > 0:
+            raise Exception(f"Nodegroup names must be unique, make the name differ between groups (e.g. with nodegroupOverrides). Duplicate names: {duplicate_names}")
+
+        if self.config['warmCapacity']:
+            processed_groups = self.apply_warm_capacity(processed_groups)
         
         self.processed_nodegroups = processed_groups
 
+    # only nodegroups where every instance type has NVMe instance storage get the scratch space
+    def add_instance_store_scratch(self, nodegroup):
+        if 'instancesDistribution' in nodegroup.keys():
+            instances = nodegroup['instancesDistribution']['instanceTypes']
+        else:
+            instances = [nodegroup['instanceType']]
+
+        instance_storages = [parse_instance_storage(self.region_information[instance]['hardware']['storage']) for instance in instances]
+        if not all(instance_storages):
+            return nodegroup
+
+        new_nodegroup = deepcopy(nodegroup)
+        num_disks = min([num_disks for num_disks, _ in instance_storages])
+        pre_bootstrap_commands = new_nodegroup.get('preBootstrapCommands', [])
+        new_nodegroup['preBootstrapCommands'] = [instance_store_scratch_command(num_disks)] + pre_bootstrap_commands
+        return new_nodegroup
+
+    def get_nodegroup_instance(self, nodegroup):
+        if 'instancesDistribution' in nodegroup.keys():
+            return nodegroup['instancesDistribution']['instanceTypes'][0]
+        else:
+            return nodegroup['instanceType']
+
+    # the expected price per hour of one node in the nodegroup
+    # for Spot nodegroups, the mean over all the pools it can launch from
+    def get_nodegroup_price(self, nodegroup):
+        instance = self.get_nodegroup_instance(nodegroup)
+        if 'instancesDistribution' in nodegroup.keys():
+            spot_prices = [price for _, _, price in self.get_spot_pools(nodegroup)]
+            if len(spot_prices) > 0:
+                return sum(spot_prices) / len(spot_prices)
+            return nodegroup['instancesDistribution']['maxPrice']
+        else:
+            return float(self.region_information[instance]['on_demand_pricing']['price'])
+
+    # the nodegroups whose nodes each profile's pods can be scheduled on: those with labels
+    # satisfying the profile's node_affinity_required, or without it, those of its instance type
+    def get_profile_nodegroups(self, nodegroups):
+        profiles = make_profile_list(self.hub_instances)
+        profiles = [self.format_profile(profile) for profile in self.apply_defaults_to_hub_profiles(profiles)]
+
+        profile_nodegroups = {}
+        for profile in profiles:
+            node_affinity_required = profile.get('kubespawner_override', {}).get('node_affinity_required')
+            if node_affinity_required:
+                matching_nodegroups = [nodegroup for nodegroup in nodegroups if node_affinity_matches(node_affinity_required, nodegroup.get('labels', {}))]
+            else:
+                matching_nodegroups = [nodegroup for nodegroup in nodegroups if self.get_nodegroup_instance(nodegroup).replace(".", "-") == profile['display_name']]
+            profile_nodegroups[profile['display_name']] = matching_nodegroups
+
+        return profile_nodegroups
+
+    def apply_warm_capacity(self, nodegroups):
+        warm_capacity = deepcopy(self.default_warm_capacity)
+        recursive_dict_copy(self.config['warmCapacity'], warm_capacity)
+        if not warm_capacity['usageHistory']:
+            raise Exception("Configuration invalid. warmCapacity must specify a usageHistory file.")
+
+        usage_history = load_usage_history(warm_capacity['usageHistory'])
+
+        # keep warm nodes only in the cheapest nodegroup that serves each profile
+        nodegroup_prices = {}
+        for profile, profile_nodegroups in self.get_profile_nodegroups(nodegroups).items():
+            for nodegroup in profile_nodegroups:
+                price = self.get_nodegroup_price(nodegroup)
+                if profile not in nodegroup_prices.keys() or price < nodegroup_prices[profile][1]:
+                    nodegroup_prices[profile] = (nodegroup['name'], price)
+        base_sizes = { nodegroup['name'] : nodegroup.get('minSize', 0) for nodegroup in nodegroups }
+
+        warm_nodes = plan_warm_capacity(
+            usage_history,
+            nodegroup_prices,
+            warm_capacity['budget'],
+            min_spawns_per_hour=warm_capacity['minSpawnsPerHour'],
+            max_warm_nodes=warm_capacity['maxWarmNodes'],
+        )
+        static_sizes, scheduled_actions = make_scaling_schedule(warm_nodes, base_sizes)
+
+        new_nodegroups = []
+        for nodegroup in nodegroups:
+            new_nodegroup = deepcopy(nodegroup)
+            if nodegroup['name'] in static_sizes.keys():
+                size = static_sizes[nodegroup['name']]
+                new_nodegroup['minSize'] = size
+                new_nodegroup['desiredCapacity'] = max(size, nodegroup.get('desiredCapacity', 0))
+            new_nodegroups.append(new_nodegroup)
+
+        num_warm = len(warm_nodes)
+        print(f"INFO: Keeping warm nodes in {num_warm} nodegroups with {len(scheduled_actions)} scheduled actions.", file=sys.stderr)
+
+        self.warm_capacity_schedule = {
+            'clusterName' : self.config['clusterName'],
+            'region' : self.config['region'],
+            'scheduledActions' : scheduled_actions,
+        }
+
+        return new_nodegroups
+
     def apply_defaults_to_hub_profiles(self, profiles):
         new_profiles = []
         for profile in profiles:
-            new_profile = deepcopy(self.default_hub_config)
-            recursive_dict_copy(profile, new_profile)
-            new_profiles.append(new_profile)
+            new_profiles.append(apply_profile_defaults(profile, self.default_hub_config))
 
         return new_profiles
 
     def format_profile(self, profile):
-        if 'display_name' in profile.keys():
-            instance_name_fmt = profile['display_name'].replace(".", "-")
-        else:
-            instance_name_fmt = ""
+        return format_profile(profile, self.config['region'])
+
+    # ranks the nodegroups for the cluster-autoscaler priority expander
+    # cheaper nodegroups get a higher priority, ties are broken by how many capacity
+    # pools (instance type and availability zone pairs) the nodegroup can launch from
+    def create_priority_expander_priorities(self, nodegroups):
+        nodegroup_names = [nodegroup['name'] for nodegroup in nodegroups]
+        if len(set(nodegroup_names)) != len(nodegroup_names):
+            raise Exception("Nodegroup names must be unique to rank them for the priority expander.")
+
+        scores = {}
+        for nodegroup in nodegroups:
+            price = round(self.get_nodegroup_price(nodegroup), 4)
+            if 'instancesDistribution' in nodegroup.keys():
+                availability = self.get_spot_pool_depth(nodegroup)
+            else:
+                availability = len(nodegroup['availabilityZones'])
+            # eksctl names the ASG eksctl-<cluster>-nodegroup-<nodegroup>-NodeGroup-<id>
+            name_regex = ".*-nodegroup-" + re.escape(nodegroup['name']) + "-NodeGroup-.*"
+            score = (price, -availability)
+            if score in scores.keys():
+                scores[score].append(name_regex)
+            else:
+                scores[score] = [name_regex]
+
+        # the highest number is the highest priority
+        priorities = {}
+        num_scores = len(scores)
+        for rank, score in enumerate(sorted(scores.keys())):
+            priorities[num_scores - rank] = sorted(scores[score])
+
+        return priorities
+
+    def apply_benchmarks(self, profiles):
+        benchmarks = load_benchmarks(self.config['benchmarks'])
+        metric = self.config['benchmarkMetric']
+
+        on_demand_prices = {}
+        spot_prices = {}
+        for instance, instance_information in self.hub_instances.items():
+            if 'on_demand_pricing' in instance_information.keys():
+                on_demand_prices[instance] = float(instance_information['on_demand_pricing']['price'])
+            spot_prices[instance] = instance_information['spot_pricing'].get('maxPrice')
+        on_demand_perf_per_dollar = compute_perf_per_dollar(benchmarks, on_demand_prices)
+        spot_perf_per_dollar = compute_perf_per_dollar(benchmarks, spot_prices)
+
+        display_names = { instance.replace(".", "-") : instance for instance in self.hub_instances.keys() }
+        new_profiles = []
+        best_in_family = {}
+        for profile in profiles:
+            new_profile = deepcopy(profile)
+            instance = display_names[profile['display_name']]
+            if instance in benchmarks.keys():
+                aws = new_profile['aws']
+                aws['benchmarks'] = benchmarks[instance]
+                aws['perf_per_dollar'] = on_demand_perf_per_dollar.get(instance, {})
+                aws['spot_perf_per_dollar'] = spot_perf_per_dollar.get(instance, {})
+                if metric in aws['perf_per_dollar'].keys():
+                    score = aws['perf_per_dollar'][metric]
+                    aws['perf_per_dollar_score'] = score
+                    family = new_profile['family']
+                    if family not in best_in_family.keys() or score > best_in_family[family]['aws']['perf_per_dollar_score']:
+                        best_in_family[family] = new_profile
+            new_profiles.append(new_profile)
 
-        region_fmt = self.config['region']
+        for profile in best_in_family.values():
+            profile['aws']['best_perf_per_dollar'] = True
 
-        def profile_formatter(value):
-            return value.format(
-                instance_name=instance_name_fmt,
-                display_name=instance_name_fmt,
-                region=region_fmt,
-            )
-        formatted_profile = deepcopy(profile)
-        formatted_profile = recursive_rename_values_in_object(formatted_profile, profile_formatter)
-        
-        return formatted_profile
+        num_benchmarked = len([instance for instance in self.hub_instances.keys() if instance in benchmarks.keys()])
+        print(f"INFO: Found benchmarks for {num_benchmarked} of {len(self.hub_instances)} instances.", file=sys.stderr)
+
+        return new_profiles
+
+    # the compact catalog the hub builds the profile list from with dynamicProfiles
+    # only the instance information make_profile needs and what was added on top
+    # of it (e.g. benchmarks) is kept, the hub defaults are stored once
+    def create_profile_catalog(self, base_profiles, profiles):
+        instances = {}
+        for instance, instance_information in self.hub_instances.items():
+            hardware = instance_information['hardware']
+            instances[instance] = {
+                'on_demand_pricing' : { 'price' : instance_information['on_demand_pricing']['price'] },
+                'hardware' : { key : hardware[key] for key in ['vcpu', 'memory', 'storage', 'gpu', 'networkPerformance', 'instanceFamily'] },
+            }
+
+        profile_overrides = {}
+        for base_profile, profile in zip(base_profiles, profiles):
+            extra_aws = { key : value for key, value in profile['aws'].items() if key not in base_profile['aws'].keys() }
+            if len(extra_aws) > 0:
+                profile_overrides[profile['display_name']] = { 'aws' : extra_aws }
+
+        catalog = {
+            'region' : self.config['region'],
+            'hubDefaults' : self.default_hub_config,
+            'filters' : self.config['profileFilters'],
+            'profileOverrides' : profile_overrides,
+            'instanceStoreScratch' : sorted(self.instance_store_scratch_instances),
+            'instances' : instances,
+        }
+        return json.dumps(catalog, separators=(',', ':'), sort_keys=True)
 
     def create_hub_config(self):
         if self.hub_instances:
-            profile_list = make_profile_list(self.hub_instances)
+            profile_list = make_profile_list(self.hub_instances, instance_store_scratch_instances=self.instance_store_scratch_instances)
+
+            base_profile_list = profile_list
+
+            if self.config['benchmarks']:
+                profile_list = self.apply_benchmarks(profile_list)
+            catalog_profile_list = profile_list
 
             num_profiles = len(profile_list)
             print(f"INFO: Creating {num_profiles} JupyterHub profiles.", file=sys.stderr)
@@ -470,9 +821,29 @@ class hubFactory():
             hub_config = {}
             jupyterhub = {}
             hub_config['jupyterhub'] = jupyterhub
-            singleuser = {}
-            jupyterhub['singleuser'] = singleuser
-            singleuser['profileList'] = deepcopy(profile_list)
+            if self.config['dynamicProfiles']:
+                catalog = self.create_profile_catalog(base_profile_list, catalog_profile_list)
+                catalog_size = len(catalog)
+                print(f"INFO: Creating a {catalog_size / 1024:.0f} KiB profile catalog for the hub.", file=sys.stderr)
+                hub_config['profile-catalog'] = catalog
+                jupyterhub['hub'] = {
+                    'extraConfig' : {
+                        'aws-hub-profile-list' : make_profile_list_snippet(profile_catalog_file),
+                    },
+                }
+            else:
+                singleuser = {}
+                jupyterhub['singleuser'] = singleuser
+                singleuser['profileList'] = deepcopy(profile_list)
+
+            if self.config['priorityExpander']:
+                priorities = self.create_priority_expander_priorities(self.processed_nodegroups)
+                print(f"INFO: Creating {len(priorities)} cluster-autoscaler priorities.", file=sys.stderr)
+                # the priorities are rendered as-is into the ConfigMap, whose keys must be integers
+                hub_config['cluster-autoscaler-priority-expander'] = {
+                    'enabled' : True,
+                    'priorities' : dump_yaml(priorities),
+                }
 
             self.profile_list = profile_list
             self.hub_config = hub_config
@@ -487,16 +858,7 @@ class hubFactory():
             num_nodegroups = len(self.processed_nodegroups)
             print(f"INFO: Creating {num_nodegroups} eksctl profiles (AWS ASGs).", file=sys.stderr)
 
-            eksctl_config = { 
-                "apiVersion" : "eksctl.io/v1alpha5", 
-                "kind" : "ClusterConfig",
-                "metadata" : {
-                    "name" : self.config['clusterName'],
-                    "region" : self.config['region']
-                },
-                "availabilityZones" : [self.config['region'] + az for az in self.config['availabilityZones']],
-                "nodeGroups" : self.processed_nodegroups,
-            }
+            eksctl_config = self.make_cluster_config(self.processed_nodegroups)
 
             self.eksctl_config = eksctl_config
         else:
@@ -505,6 +867,69 @@ class hubFactory():
             self.process_groups()
             return self.create_eksctl_config()
 
+    def make_cluster_config(self, nodegroups):
+        return { 
+            "apiVersion" : "eksctl.io/v1alpha5", 
+            "kind" : "ClusterConfig",
+            "metadata" : {
+                "name" : self.config['clusterName'],
+                "region" : self.config['region']
+            },
+            "availabilityZones" : [self.config['region'] + az for az in self.config['availabilityZones']],
+            "nodeGroups" : nodegroups,
+        }
+
+    # splits the nodegroups into shards by family and availability zones so that
+    # each shard can be created (and retried) with its own `eksctl create nodegroup`
+    def create_eksctl_shards(self):
+        if self.processed_nodegroups:
+            max_nodegroups = self.config['maxNodegroupsPerShard']
+
+            nodegroups_by_key = {}
+            for nodegroup in self.processed_nodegroups:
+                family = self.get_nodegroup_instance(nodegroup).split(".")[0]
+                availability_zones_short = "".join([az.split(self.config['region'])[-1] for az in nodegroup['availabilityZones']])
+                key = f"{family}-{availability_zones_short}"
+                if key in nodegroups_by_key.keys():
+                    nodegroups_by_key[key].append(nodegroup)
+                else:
+                    nodegroups_by_key[key] = [nodegroup]
+
+            cluster_file = "cluster.yaml"
+            shards = {}
+            manifest = {
+                'cluster' : {
+                    'file' : cluster_file,
+                    'command' : f"eksctl create cluster -f {cluster_file} --without-nodegroup",
+                },
+                'shards' : [],
+            }
+            for key, nodegroups in sorted(nodegroups_by_key.items()):
+                for i in range(0, len(nodegroups), max_nodegroups):
+                    shard_nodegroups = nodegroups[i:i + max_nodegroups]
+                    shard_name = f"{key}-{i // max_nodegroups}"
+                    shard_file = f"nodegroups-{shard_name}.yaml"
+                    shards[shard_file] = self.make_cluster_config(shard_nodegroups)
+                    manifest['shards'].append({
+                        'name' : shard_name,
+                        'file' : shard_file,
+                        'nodegroups' : [nodegroup['name'] for nodegroup in shard_nodegroups],
+                        # existing nodegroups are skipped, so a failed shard can simply be re-run
+                        'command' : f"eksctl create nodegroup -f {shard_file}",
+                    })
+
+            num_shards = len(manifest['shards'])
+            largest_shard = max([len(shard['nodegroups']) for shard in manifest['shards']])
+            print(f"INFO: Splitting {len(self.processed_nodegroups)} nodegroups into {num_shards} eksctl shards of at most {largest_shard} nodegroups.", file=sys.stderr)
+
+            shards[cluster_file] = self.make_cluster_config([])
+            self.eksctl_shards = (shards, manifest)
+        else:
+            print("Nodegroups not processed!", file=sys.stderr)
+            print("Trying now...", file=sys.stderr)
+            self.process_groups()
+            return self.create_eksctl_shards()
+
     def dump_hub_config(self):
         if self.hub_config:
             return dump_yaml(self.hub_config)
@@ -523,6 +948,30 @@ class hubFactory():
             self.create_eksctl_config()
             return self.dump_eksctl_config()
 
+    def dump_eksctl_shards(self, directory):
+        if self.eksctl_shards:
+            shards, manifest = self.eksctl_shards
+            os.makedirs(directory, exist_ok=True)
+            for shard_file, shard_config in shards.items():
+                open(os.path.join(directory, shard_file), "w").write(dump_yaml(shard_config))
+            open(os.path.join(directory, "manifest.yaml"), "w").write(dump_yaml(manifest))
+        else:
+            print("eksctl shards not set!", file=sys.stderr)
+            print("Trying now...", file=sys.stderr)
+            self.create_eksctl_shards()
+            return self.dump_eksctl_shards(directory)
+
+    def dump_warm_capacity_schedule(self):
+        if self.warm_capacity_schedule:
+            return dump_yaml(self.warm_capacity_schedule)
+        elif self.processed_nodegroups:
+            raise Exception("Warm capacity not planned! Set warmCapacity in the configuration.")
+        else:
+            print("Nodegroups not processed!", file=sys.stderr)
+            print("Trying now...", file=sys.stderr)
+            self.process_groups()
+            return self.dump_warm_capacity_schedule()
+
 
 def main():
     parser = argparse.ArgumentParser()
@@ -530,13 +979,39 @@ def main():
     parser.add_argument('--json', '-j', type=str, help='A JSON string containing the configuration to use.')
     parser.add_argument('--hub_out', '-ho', type=str, help='A filename specifying where the hub configuration should be printed to.')
     parser.add_argument('--eksctl_out', '-eo', type=str, help='A filename specifying where the eksctl configuration should be printed to.')
+    parser.add_argument('--eksctl_shard_dir', '-ed', type=str, help='A directory where the cluster, eksctl nodegroup shards and their manifest should be written to.')
+    parser.add_argument('--warm_schedule_out', '-wo', type=str, help='A filename specifying where the warm capacity scheduled scaling manifest should be printed to.')
+
+    subparsers = parser.add_subparsers(dest='command')
+    select_parser = subparsers.add_parser('select', help='Select instances in a region matching constraints.')
+    select_parser.add_argument('--region', '-r', type=str, default=hubFactory.default_config['region'], help='The region to select instances from.')
+    select_parser.add_argument('--catalog', '-c', type=str, help='A JSON file caching the instance information for the region. Created if it does not exist.')
+    select_parser.add_argument('--vcpu', type=parse_range, help='Range of vCPUs as MIN:MAX, MIN: or :MAX.')
+    select_parser.add_argument('--memory', type=parse_range, help='Range of memory in GiB.')
+    select_parser.add_argument('--gpu', type=parse_range, help='Range of GPUs.')
+    select_parser.add_argument('--price', type=parse_range, help='Range of the on-demand price in dollars per hour.')
+    select_parser.add_argument('--spot_price', type=parse_range, help='Range of the maximum Spot price in dollars per hour.')
+    select_parser.add_argument('--spot_azs', type=parse_range, help='Range of the number of availability zones the instance is available in as a Spot instance.')
+    select_parser.add_argument('--availability_zones', '-az', type=str, nargs='+', help='Availability zones (e.g. a b c) the instance must be available in as a Spot instance.')
+    select_parser.add_argument('--families', type=str, nargs='+', help='Instance families to select from.')
+    warm_schedule_parser = subparsers.add_parser('apply-warm-schedule', help='Apply a warm capacity schedule to the nodegroups\' Auto Scaling Groups.')
+    warm_schedule_parser.add_argument('schedule', type=str, help='The warm capacity schedule written with --warm_schedule_out.')
 
     args = parser.parse_args()
 
+    if args.command == 'select':
+        select(args)
+        return
+    if args.command == 'apply-warm-schedule':
+        apply_scaling_schedule(load_yaml_from_file(args.schedule))
+        return
+
     config_file = args.file
     config_data_json = args.json
     hub_out = args.hub_out
     eksctl_out = args.eksctl_out
+    eksctl_shard_dir = args.eksctl_shard_dir
+    warm_schedule_out = args.warm_schedule_out
 
     def _print_hub_config(factory, hub_out):
         hub_config = factory.dump_hub_config()
@@ -568,6 +1043,30 @@ def main():
         _print_hub_config(factory, hub_out)
     if eksctl_out:
         _print_eksctl_config(factory, eksctl_out)
+    if eksctl_shard_dir:
+        factory.dump_eksctl_shards(eksctl_shard_dir)
+    if warm_schedule_out:
+        open(warm_schedule_out, "w").write(factory.dump_warm_capacity_schedule())
+
+def select(args):
+    region_information = get_region_information(args.region, args.catalog)
+    selector = instanceSelector(region_information)
+
+    ranges = {}
+    for attribute, range_value in [('vcpu', args.vcpu), ('memory', args.memory), ('gpu', args.gpu), 
+                                   ('price', args.price), ('spot_price', args.spot_price), 
+                                   ('spot_availability_zones', args.spot_azs)]:
+        if range_value:
+            ranges[attribute] = range_value
+    if args.availability_zones:
+        availability_zones = [args.region + az for az in args.availability_zones]
+    else:
+        availability_zones = None
+
+    start = time.perf_counter()
+    instances = selector.select(availability_zones=availability_zones, families=args.families, **ranges)
+    elapsed = time.perf_counter() - start
+    print(f"INFO: Selected {len(instances)} instances in {elapsed * 1e6:.0f} us.", file=sys.stderr)
 
-if __name__ == "__main__":
-    main()
+    # ready to paste into a group in the configuration
+    print(dump_yaml({ 'instances' : instances }))
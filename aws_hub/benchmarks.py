@@ -0,0 +1,33 @@
+from .utils import load_yaml_from_file
+
+# price-performance from our own benchmark runs
+# process:
+# - read benchmark scores per instance type (e.g. cpu, memory_bandwidth, gpu)
+# - lay the scores and prices out as columns, one per metric
+# - divide the columns element-wise to get performance per dollar
+
+def load_benchmarks(filename):
+    # benchmarks are a YAML (or JSON) mapping of
+    # instance type -> metric name -> score (higher is better)
+    benchmarks = load_yaml_from_file(filename)
+    if not benchmarks:
+        return {}
+    return { instance : { metric : float(score) for metric, score in scores.items() } for instance, scores in benchmarks.items() }
+
+def compute_perf_per_dollar(benchmarks, prices):
+    # benchmarks: instance type -> metric -> score
+    # prices: instance type -> price per hour (None if unknown)
+    # returns instance type -> metric -> score per dollar
+    instances = [instance for instance in benchmarks.keys() if prices.get(instance)]
+    metrics = sorted(set(sum([list(benchmarks[instance].keys()) for instance in instances], [])))
+    price_column = [prices[instance] for instance in instances]
+
+    perf_per_dollar = { instance : {} for instance in instances }
+    for metric in metrics:
+        score_column = [benchmarks[instance].get(metric) for instance in instances]
+        metric_column = [score / price if score is not None else None for score, price in zip(score_column, price_column)]
+        for instance, value in zip(instances, metric_column):
+            if value is not None:
+                perf_per_dollar[instance][metric] = round(value, 2)
+
+    return perf_per_dollar
@@ -1,17 +1,22 @@
-import argparse
-import boto3
 import json
-from pkg_resources import resource_filename
 import datetime
 import sys
 
+# days of Spot price history averaged over, the same for every caller
+default_time_ago = 1
+
+# boto3, botocore and importlib.resources are imported only when AWS is actually
+# queried so that offline use (e.g. with a cached catalog) starts quickly
+
 def map_region_code_to_name(region):
-    endpoint_file = resource_filename('botocore', 'data/endpoints.json')
-    with open(endpoint_file, 'r') as f:
+    from importlib import resources
+    endpoint_file = resources.files('botocore').joinpath('data/endpoints.json')
+    with endpoint_file.open('r') as f:
         data = json.load(f)
     return data['partitions'][0]['regions'][region]['description']
 
 def make_boto3_client(client_type, api_region):
+    import boto3
     client = boto3.client(client_type, region_name=api_region)
     return client
 
@@ -66,7 +71,8 @@ def get_instance_descriptions(instance_information):
 
     return instance_descriptions
 
-def get_spot_price_for_instance_names(region, availability_zones, instance_names, time_ago=10, operating_system="Linux"):
+# the product description Spot prices are recorded under
+def get_spot_operating_system_description(operating_system):
     if operating_system == "Linux" or operating_system == "Linux/Unix":
         operating_system_description = "Linux/UNIX"
     elif operating_system == "Windows":
@@ -75,19 +81,32 @@ def get_spot_price_for_instance_names(region, availability_zones, instance_names
         operating_system_description = "Red Hat Enterprise Linux"
     elif operating_system == "SUSE" or operating_system == "SUSE Linux":
         operating_system_description = "SUSE Linux"
+    return operating_system_description
+
+# with a price store only samples newer than the store's high water mark are
+# fetched, and the averages are computed by the store over the whole window
+def get_spot_price_for_instance_names(region, availability_zones, instance_names, time_ago=default_time_ago, operating_system="Linux", price_store=None):
+    operating_system_description = get_spot_operating_system_description(operating_system)
     
     client = make_boto3_client("ec2", region)
 
     paginator = client.get_paginator('describe_spot_price_history')
 
-    now = datetime.datetime.now()
+    now = datetime.datetime.now(datetime.timezone.utc)
     past = now - datetime.timedelta(days=time_ago)
+    start = past
+    if price_store:
+        high_water_mark = price_store.get_high_water_mark(region, operating_system_description, instance_names)
+        if high_water_mark:
+            start = max(past, datetime.datetime.fromtimestamp(high_water_mark, datetime.timezone.utc))
     pages = paginator.paginate(InstanceTypes=instance_names, 
                                 ProductDescriptions=[operating_system_description],
-                                StartTime=past,
+                                StartTime=start,
                                 EndTime=now)
 
     spot_data = {}
+    spot_records = []
+    confirmed_records = []
     for page in pages:
         for spot_record in page['SpotPriceHistory']:
             instance_type = spot_record['InstanceType']
@@ -95,6 +114,20 @@ def get_spot_price_for_instance_names(region, availability_zones, instance_names
 
             spot_price = float(spot_record["SpotPrice"])
 
+            if price_store:
+                # AWS also returns the price in effect at StartTime, which can be much older than
+                # StartTime if the price has been stable
+                timestamp = spot_record['Timestamp'].timestamp()
+                if timestamp < start.timestamp():
+                    # a delta fetch already stored it in an earlier run, but it confirms the pool is still offered
+                    if start > past:
+                        confirmed_records.append((instance_type, availability_zone, timestamp, spot_price))
+                        continue
+                    # otherwise count it as observed at the start of the window
+                    timestamp = start.timestamp()
+                spot_records.append((instance_type, availability_zone, timestamp, spot_price))
+                continue
+
             try:
                 spot_data[instance_type]
             except KeyError:
@@ -106,11 +139,16 @@ def get_spot_price_for_instance_names(region, availability_zones, instance_names
             
             spot_data[instance_type][availability_zone].append(spot_price)
 
+    if price_store:
+        price_store.add_spot_prices(region, operating_system_description, instance_names, spot_records, now.timestamp(), confirmed_records=confirmed_records)
+        spot_data = price_store.get_mean_spot_prices(operating_system_description, availability_zones, past.timestamp(), instance_names=instance_names)
+    else:
+        for instance_type, instance_data in spot_data.items():
+            for availability_zone, spot_prices in instance_data.items():
+                spot_data[instance_type][availability_zone] = sum(spot_prices) / len(spot_prices)
+
     for instance_type, instance_data in spot_data.items():
-        instance_availability_zones = []
-        for availability_zone, spot_prices in instance_data.items():
-            spot_data[instance_type][availability_zone] = sum(spot_prices) / len(spot_prices)
-            instance_availability_zones.append(availability_zone)
+        instance_availability_zones = list(instance_data.keys())
         
         availability_zones_extra = [az for az in instance_availability_zones if az not in availability_zones]
         for az in availability_zones_extra:
@@ -124,7 +162,7 @@ def get_spot_price_for_instance_names(region, availability_zones, instance_names
 
     return spot_data
 
-def get_spot_price_for_instance_families(region, availability_zones, instance_families, time_ago=1, operating_system="Linux"):
+def get_spot_price_for_instance_families(region, availability_zones, instance_families, time_ago=default_time_ago, operating_system="Linux"):
     region_instance_info = get_instances_types(region)
 
     instance_names = []
@@ -142,14 +180,14 @@ def get_spot_price_for_instance_families(region, availability_zones, instance_fa
 
     return region_families_prices
 
-def get_all_spot_prices(region, availability_zones, time_ago=1, operating_system="Linux"):
-    return get_spot_price_for_instance_names(region, availability_zones, [], time_ago=time_ago, operating_system=operating_system)
+def get_all_spot_prices(region, availability_zones, time_ago=default_time_ago, operating_system="Linux", price_store=None):
+    return get_spot_price_for_instance_names(region, availability_zones, [], time_ago=time_ago, operating_system=operating_system, price_store=price_store)
 
 
-def get_on_demand_price_for_instance_names(region, availability_zones, instance_names, time_ago=10, operating_system="Linux"):
+def get_on_demand_price_for_instance_names(region, availability_zones, instance_names, time_ago=default_time_ago, operating_system="Linux"):
     pass
 
-def get_spot_prices_for_region(region, operating_system="Linux", time_ago=1):
+def get_spot_prices_for_region(region, operating_system="Linux", time_ago=default_time_ago, price_store=None):
     availability_zones = get_all_availability_zones_for_region(
         region
     )
@@ -157,11 +195,12 @@ def get_spot_prices_for_region(region, operating_system="Linux", time_ago=1):
         region, 
         availability_zones, 
         operating_system=operating_system,
-        time_ago=time_ago
+        time_ago=time_ago,
+        price_store=price_store,
     )
     return spot_prices
 
-def get_on_demand_prices_for_region(region, operating_system="Linux"):
+def get_on_demand_prices_for_region(region, operating_system="Linux", price_store=None):
     def get_on_demand_price(instance_info):
         on_demand_pricing = instance_info['terms']['OnDemand']
         instance_id = list(on_demand_pricing.keys())[0]
@@ -182,11 +221,16 @@ def get_on_demand_prices_for_region(region, operating_system="Linux"):
         on_demand_price, on_demand_price_description = get_on_demand_price(data['data'])
         pricing_data[instance_name] = { 'price' : on_demand_price, 'description' : on_demand_price_description}
 
+    if price_store:
+        now = datetime.datetime.now(datetime.timezone.utc)
+        prices = { instance_name : float(data['price']) for instance_name, data in pricing_data.items() }
+        price_store.add_on_demand_prices(region, operating_system, prices, now.timestamp())
+
     return pricing_data
 
-def get_pricing_info_for_region(region, operating_system="Linux"):
-    on_demand_prices = get_on_demand_prices_for_region(region, operating_system=operating_system)
-    spot_prices = get_spot_prices_for_region(region, operating_system=operating_system)
+def get_pricing_info_for_region(region, operating_system="Linux", price_store=None):
+    on_demand_prices = get_on_demand_prices_for_region(region, operating_system=operating_system, price_store=price_store)
+    spot_prices = get_spot_prices_for_region(region, operating_system=operating_system, price_store=price_store)
     return { "on_demand" : on_demand_prices, "spot" : spot_prices }
 
 def get_instance_hardware_information_for_region(region, operating_system="Linux"):
@@ -211,10 +255,33 @@ def get_instance_hardware_information_for_region(region, operating_system="Linux
 
     return instance_descriptions
 
-def get_all_instance_information_for_region(region, operating_system="Linux"):
+# the NVMe instance storage of every instance type as reported by EC2, formatted like the
+# Pricing API's storage attribute but always in GB (the Pricing API gives some sizes in TB,
+# e.g. "1 x 0.475 NVMe SSD" for i3.large)
+def get_instance_storage_for_region(region):
+    client = make_boto3_client("ec2", region)
+    paginator = client.get_paginator('describe_instance_types')
+    pages = paginator.paginate(Filters=[{ 'Name' : 'instance-storage-supported', 'Values' : ['true'] }])
+
+    instance_storage = {}
+    for page in pages:
+        for instance_type in page['InstanceTypes']:
+            storage_info = instance_type.get('InstanceStorageInfo')
+            if not storage_info or storage_info.get('NvmeSupport', 'unsupported') == 'unsupported':
+                continue
+            if any([disk['Type'] != 'ssd' for disk in storage_info['Disks']]):
+                continue
+            num_disks = sum([disk['Count'] for disk in storage_info['Disks']])
+            disk_size_gb = storage_info['TotalSizeInGB'] / num_disks
+            instance_storage[instance_type['InstanceType']] = f"{num_disks} x {disk_size_gb:g} GB NVMe SSD"
+
+    return instance_storage
+
+def get_all_instance_information_for_region(region, operating_system="Linux", price_store=None):
     pricing_info = get_pricing_info_for_region(
         region, 
         operating_system=operating_system,
+        price_store=price_store,
     )
     on_demand_pricing = pricing_info['on_demand']
     spot_pricing = pricing_info['spot']
@@ -223,6 +290,10 @@ def get_all_instance_information_for_region(region, operating_system="Linux"):
         region,
         operating_system=operating_system
     )
+    instance_storage = get_instance_storage_for_region(region)
+    for instance_name, storage in instance_storage.items():
+        if instance_name in hardware_info.keys():
+            hardware_info[instance_name]['storage'] = storage
 
     all_instances = set(on_demand_pricing.keys()).union(
         set(spot_pricing.keys())
@@ -253,4 +324,13 @@ def get_all_instance_information_for_region(region, operating_system="Linux"):
         else:
             print(f"WARNING: {instance_name} has no hardware information.", file=sys.stderr)
 
-    return all_instance_information
\ No newline at end of file
+    return all_instance_information
+
+# Saves the instance information for a region so it can be reused without querying AWS
+def save_region_information(region_information, filename):
+    with open(filename, "w") as f:
+        json.dump(region_information, f)
+
+def load_region_information(filename):
+    with open(filename, "r") as f:
+        return json.load(f)
@@ -0,0 +1,105 @@
+from .utils import parse_memory_gib
+from bisect import bisect_left, bisect_right
+
+# answers multi-constraint queries over the instance information for a region
+# process:
+# - give every instance a bit in an integer bitmap
+# - for each numeric attribute, sort the instances by value and keep a prefix
+#   bitmap for every position so a range is two bisections and one AND
+# - keep a bitmap per availability zone (Spot availability) and per family
+# - a query is the AND of the bitmaps of all of its constraints
+
+def get_spot_prices(instance_information):
+    spot_pricing = instance_information.get('spot_pricing') or {}
+    # maxPrice is added by hubFactory next to the per availability zone prices
+    return { az : price for az, price in spot_pricing.items() if az != 'maxPrice' and price }
+
+class instanceSelector():
+    range_attributes = ['vcpu', 'memory', 'gpu', 'price', 'spot_price', 'spot_availability_zones']
+
+    instances = None
+    values = None
+    range_indexes = None
+    availability_zone_bitmaps = None
+    family_bitmaps = None
+    all_bitmap = None
+
+    def __init__(self, region_information):
+        self.instances = sorted(region_information.keys())
+        self.values = { attribute : {} for attribute in self.range_attributes }
+        self.availability_zone_bitmaps = {}
+        self.family_bitmaps = {}
+        self.all_bitmap = (1 << len(self.instances)) - 1
+
+        for i, instance in enumerate(self.instances):
+            instance_information = region_information[instance]
+            bit = 1 << i
+
+            family = instance.split(".")[0]
+            self.family_bitmaps[family] = self.family_bitmaps.get(family, 0) | bit
+
+            spot_prices = get_spot_prices(instance_information)
+            for az in spot_prices.keys():
+                self.availability_zone_bitmaps[az] = self.availability_zone_bitmaps.get(az, 0) | bit
+            self.values['spot_availability_zones'][instance] = len(spot_prices)
+            if len(spot_prices) > 0:
+                self.values['spot_price'][instance] = max(spot_prices.values())
+
+            if 'on_demand_pricing' in instance_information.keys():
+                self.values['price'][instance] = float(instance_information['on_demand_pricing']['price'])
+
+            hardware = instance_information.get('hardware')
+            if hardware:
+                if hardware['vcpu']:
+                    self.values['vcpu'][instance] = float(hardware['vcpu'])
+                if hardware['memory']:
+                    self.values['memory'][instance] = parse_memory_gib(hardware['memory'])
+                self.values['gpu'][instance] = float(hardware['gpu']) if hardware['gpu'] else 0.
+
+        instance_indexes = { instance : i for i, instance in enumerate(self.instances) }
+        self.range_indexes = {}
+        for attribute in self.range_attributes:
+            entries = sorted([(value, instance_indexes[instance]) for instance, value in self.values[attribute].items()])
+            sorted_values = [value for value, _ in entries]
+            prefix_bitmaps = [0]
+            for _, i in entries:
+                prefix_bitmaps.append(prefix_bitmaps[-1] | (1 << i))
+            self.range_indexes[attribute] = (sorted_values, prefix_bitmaps)
+
+    def range_bitmap(self, attribute, minimum=None, maximum=None):
+        if attribute not in self.range_indexes.keys():
+            raise Exception(f"Cannot select on {attribute}. Valid attributes are {self.range_attributes}")
+        sorted_values, prefix_bitmaps = self.range_indexes[attribute]
+        low = 0 if minimum is None else bisect_left(sorted_values, minimum)
+        high = len(sorted_values) if maximum is None else bisect_right(sorted_values, maximum)
+        if high <= low:
+            return 0
+        return prefix_bitmaps[high] & ~prefix_bitmaps[low]
+
+    def bitmap_to_instances(self, bitmap):
+        instances = []
+        while bitmap:
+            # isolate and clear the lowest set bit
+            lowest_bit = bitmap & -bitmap
+            instances.append(self.instances[lowest_bit.bit_length() - 1])
+            bitmap ^= lowest_bit
+        return instances
+
+    # ranges are given as attribute=(minimum, maximum) with None for an open end, e.g.
+    # select(memory=(64, None), gpu=(1, None), price=(None, 3), spot_availability_zones=(3, None))
+    def select(self, availability_zones=None, families=None, **ranges):
+        bitmap = self.all_bitmap
+        for attribute, (minimum, maximum) in ranges.items():
+            bitmap &= self.range_bitmap(attribute, minimum, maximum)
+        if availability_zones:
+            for az in availability_zones:
+                bitmap &= self.availability_zone_bitmaps.get(az, 0)
+        if families:
+            family_bitmap = 0
+            for family in families:
+                family_bitmap |= self.family_bitmaps.get(family, 0)
+            bitmap &= family_bitmap
+
+        instances = self.bitmap_to_instances(bitmap)
+        # cheapest first, instances without a price last
+        return sorted(instances, key=lambda instance : (self.values['price'].get(instance, float("inf")), instance))
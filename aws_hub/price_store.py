@@ -0,0 +1,207 @@
+import sqlite3
+
+# keeps Spot and on-demand price observations across runs in a SQLite database
+# process:
+# - raw Spot price observations are keyed by (instance type, availability zone, timestamp)
+#   so refetching an overlapping window never double counts
+# - every new observation is also added to an hourly rollup (count, sum, sum of squares, max)
+#   so windowed statistics never rescan the raw observations
+# - the newest price of every (instance type, availability zone) is kept as its current price,
+#   so instances whose price has not changed in a long time still have a price, as long as
+#   a fetch inside the window confirmed that AWS still offers the pool
+# - a high water mark per query remembers the newest observation fetched, so each
+#   run only asks AWS for newer samples
+
+seconds_in_hour = 3600
+seconds_in_day = 24 * seconds_in_hour
+
+schema = """
+CREATE TABLE IF NOT EXISTS spot_prices (
+    instance_type TEXT NOT NULL,
+    availability_zone TEXT NOT NULL,
+    operating_system TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (instance_type, availability_zone, operating_system, timestamp)
+);
+CREATE TABLE IF NOT EXISTS spot_price_hours (
+    instance_type TEXT NOT NULL,
+    availability_zone TEXT NOT NULL,
+    operating_system TEXT NOT NULL,
+    hour INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    total REAL NOT NULL,
+    total_squares REAL NOT NULL,
+    maximum REAL NOT NULL,
+    PRIMARY KEY (instance_type, availability_zone, operating_system, hour)
+);
+CREATE TABLE IF NOT EXISTS current_spot_prices (
+    instance_type TEXT NOT NULL,
+    availability_zone TEXT NOT NULL,
+    operating_system TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    price REAL NOT NULL,
+    confirmed REAL NOT NULL,
+    PRIMARY KEY (instance_type, availability_zone, operating_system)
+);
+CREATE TABLE IF NOT EXISTS on_demand_prices (
+    region TEXT NOT NULL,
+    instance_type TEXT NOT NULL,
+    operating_system TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (region, instance_type, operating_system, timestamp)
+);
+CREATE TABLE IF NOT EXISTS high_water_marks (
+    region TEXT NOT NULL,
+    operating_system TEXT NOT NULL,
+    query TEXT NOT NULL,
+    timestamp REAL NOT NULL,
+    PRIMARY KEY (region, operating_system, query)
+);
+"""
+
+# the query a high water mark belongs to, all instance types if none are given
+def make_query_key(instance_names):
+    if instance_names:
+        return ",".join(sorted(instance_names))
+    return "*"
+
+class priceStore():
+    filename = None
+    connection = None
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.connection = sqlite3.connect(filename)
+        self.connection.executescript(schema)
+
+    def close(self):
+        self.connection.close()
+
+    def get_high_water_mark(self, region, operating_system, instance_names):
+        row = self.connection.execute(
+            "SELECT timestamp FROM high_water_marks WHERE region = ? AND operating_system = ? AND query = ?",
+            (region, operating_system, make_query_key(instance_names))
+        ).fetchone()
+        return row[0] if row else None
+
+    # records are (instance type, availability zone, timestamp, price) tuples
+    # confirmed_records are records of prices fetched again that are not new observations,
+    # they only confirm that the pool is still offered at fetched_until
+    def add_spot_prices(self, region, operating_system, instance_names, records, fetched_until, confirmed_records=()):
+        with self.connection:
+            for instance_type, availability_zone, timestamp, price in list(records) + list(confirmed_records):
+                self.connection.execute(
+                    """INSERT INTO current_spot_prices VALUES (?, ?, ?, ?, ?, ?)
+                       ON CONFLICT (instance_type, availability_zone, operating_system) DO UPDATE SET
+                       timestamp = MAX(timestamp, excluded.timestamp),
+                       price = CASE WHEN excluded.timestamp >= timestamp THEN excluded.price ELSE price END,
+                       confirmed = MAX(confirmed, excluded.confirmed)""",
+                    (instance_type, availability_zone, operating_system, timestamp, price, fetched_until)
+                )
+
+            for instance_type, availability_zone, timestamp, price in records:
+                cursor = self.connection.execute(
+                    "INSERT OR IGNORE INTO spot_prices VALUES (?, ?, ?, ?, ?)",
+                    (instance_type, availability_zone, operating_system, timestamp, price)
+                )
+                # observations already in the store are already in the rollup
+                if cursor.rowcount == 0:
+                    continue
+                self.connection.execute(
+                    """INSERT INTO spot_price_hours VALUES (?, ?, ?, ?, 1, ?, ?, ?)
+                       ON CONFLICT (instance_type, availability_zone, operating_system, hour) DO UPDATE SET
+                       count = count + 1, total = total + excluded.total,
+                       total_squares = total_squares + excluded.total_squares,
+                       maximum = MAX(maximum, excluded.maximum)""",
+                    (instance_type, availability_zone, operating_system, int(timestamp // seconds_in_hour), price, price * price, price)
+                )
+            self.connection.execute(
+                "INSERT OR REPLACE INTO high_water_marks VALUES (?, ?, ?, ?)",
+                (region, operating_system, make_query_key(instance_names), fetched_until)
+            )
+
+    # prices is a mapping of instance type -> price
+    def add_on_demand_prices(self, region, operating_system, prices, timestamp):
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO on_demand_prices VALUES (?, ?, ?, ?, ?)",
+                [(region, instance_type, operating_system, timestamp, price) for instance_type, price in prices.items()]
+            )
+
+    # mean Spot price of every instance type in every availability zone since a timestamp
+    # the current price stands in for instance types whose price has not changed since then,
+    # if a fetch since then confirmed it
+    # returns instance type -> availability zone -> mean price
+    def get_mean_spot_prices(self, operating_system, availability_zones, since, instance_names=None):
+        spot_data = {}
+        instance_names = set(instance_names) if instance_names else None
+        availability_zone_placeholders = ",".join("?" * len(availability_zones))
+        rows = self.connection.execute(
+            f"""SELECT instance_type, availability_zone, SUM(total) / SUM(count) FROM spot_price_hours
+                WHERE operating_system = ? AND hour >= ? AND availability_zone IN ({availability_zone_placeholders})
+                GROUP BY instance_type, availability_zone""",
+            [operating_system, int(since // seconds_in_hour)] + list(availability_zones)
+        ).fetchall()
+        current_rows = self.connection.execute(
+            f"""SELECT instance_type, availability_zone, price FROM current_spot_prices
+                WHERE operating_system = ? AND confirmed >= ? AND availability_zone IN ({availability_zone_placeholders})""",
+            [operating_system, since] + list(availability_zones)
+        ).fetchall()
+        for instance_type, availability_zone, mean_price in current_rows + rows:
+            if instance_names and instance_type not in instance_names:
+                continue
+            if instance_type not in spot_data.keys():
+                spot_data[instance_type] = {}
+            spot_data[instance_type][availability_zone] = mean_price
+        return spot_data
+
+    # the current price of a pool, None if no fetch since a timestamp confirmed it
+    def get_current_spot_price(self, instance_type, availability_zone, operating_system, since):
+        row = self.connection.execute(
+            """SELECT price FROM current_spot_prices
+               WHERE instance_type = ? AND availability_zone = ? AND operating_system = ? AND confirmed >= ?""",
+            (instance_type, availability_zone, operating_system, since)
+        ).fetchone()
+        return row[0] if row else None
+
+    # windowed Spot price statistics from the hourly rollup, None if there are no observations
+    # p95 is taken over the hourly maxima, so it slightly overestimates the true p95
+    # a price that has not changed during the window is its current price, without volatility
+    def get_spot_price_statistics(self, instance_type, availability_zone, operating_system, days, now):
+        since_hour = int((now - days * seconds_in_day) // seconds_in_hour)
+        count, total, total_squares, maximum, num_hours = self.connection.execute(
+            """SELECT SUM(count), SUM(total), SUM(total_squares), MAX(maximum), COUNT(*) FROM spot_price_hours
+               WHERE instance_type = ? AND availability_zone = ? AND operating_system = ? AND hour >= ?""",
+            (instance_type, availability_zone, operating_system, since_hour)
+        ).fetchone()
+        if not count:
+            current_price = self.get_current_spot_price(instance_type, availability_zone, operating_system, now - days * seconds_in_day)
+            if current_price is None:
+                return None
+            return {
+                'count' : 1,
+                'mean' : current_price,
+                'max' : current_price,
+                'p95' : current_price,
+                'volatility' : 0.,
+            }
+
+        mean = total / count
+        variance = max(total_squares / count - mean * mean, 0.)
+        p95_offset = int(0.95 * (num_hours - 1))
+        p95 = self.connection.execute(
+            """SELECT maximum FROM spot_price_hours
+               WHERE instance_type = ? AND availability_zone = ? AND operating_system = ? AND hour >= ?
+               ORDER BY maximum LIMIT 1 OFFSET ?""",
+            (instance_type, availability_zone, operating_system, since_hour, p95_offset)
+        ).fetchone()[0]
+
+        return {
+            'count' : count,
+            'mean' : mean,
+            'max' : maximum,
+            'p95' : p95,
+            'volatility' : variance ** 0.5,
+        }
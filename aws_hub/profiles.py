@@ -0,0 +1,227 @@
+import json
+import os
+from fnmatch import fnmatch
+from copy import deepcopy
+from .utils import recursive_dict_copy, recursive_rename_values_in_object, parse_memory_gib, parse_instance_storage
+
+# makes JupyterHub (KubeSpawner) profiles from instance information
+# the functions here only use the standard library and the functions from utils
+# listed in profile_list_functions, so their source can be shipped to the hub in
+# hub.extraConfig and build the profile list on demand from a compact catalog
+
+# where the NVMe instance store scratch space is mounted in notebooks
+scratch_mount_path = "/scratch"
+
+def make_profile(instance_name, instance_info, instance_store_scratch=True):
+    # display name
+    # description (from hardware information)
+    # family (from instance name)
+    # category (from hardware)
+    # kubespawner_override: from node taints in configuration
+    # cpu_limit / mem_limit: from hardware information
+    # extra_resource_limits: if gpu, nvidia.com/gpu
+    # volumes / volume_mounts: scratch space on NVMe instance storage
+
+    on_demand_pricing = instance_info['on_demand_pricing']
+    hardware = instance_info['hardware']
+    display_name = instance_name.replace(".", "-")
+    family = instance_name.split(".")[0].upper()
+    category = hardware['instanceFamily']
+    cpu_str = hardware['vcpu']
+    mem_str = hardware['memory']
+    storage = hardware['storage']
+    gpu = hardware['gpu']
+    network_performance = hardware['networkPerformance']
+
+    if gpu:
+        description = "{} CPU, {} RAM, {} GPU".format(cpu_str, mem_str, gpu)
+    else:
+        description = "{} CPU, {} RAM".format(cpu_str, mem_str)
+
+    on_demand_price = float(on_demand_pricing['price'])
+    if on_demand_price > 0.01:
+        on_demand_price_str = "${:.2f}/hour".format(on_demand_price)
+    else:
+        on_demand_price_str = "${:.3f}/hour".format(on_demand_price)
+
+    profile = {}
+    profile['display_name'] = display_name
+    profile['family'] = family
+    profile['category'] = category
+    profile['description'] = description
+
+    aws = {}
+    aws['instance_size'] = display_name.split("-")[-1]
+    aws['price'] = on_demand_price
+    aws['price_description'] = on_demand_price_str
+    aws['network'] = network_performance
+    aws['cpu'] = cpu_str
+    aws['memory'] = mem_str
+    aws['storage'] = storage
+    aws['gpu'] = gpu
+    profile['aws'] = aws
+
+    kubespawner_override = {}
+    cpu_limit = float(cpu_str)
+    cpu_undershoot_ratio = 0.9
+    cpu_guarantee = float("{:.1f}".format(float(cpu_str) * cpu_undershoot_ratio))
+    cpu_guarantee = float("{:.1f}".format(cpu_limit - 0.5))
+    mem_gib = parse_memory_gib(mem_str)
+    # GiB = 2^30 bytes, GB = 10^9 bytes
+    gib_to_gb = 1e9 / (2**30)
+    mem_gb = mem_gib * gib_to_gb
+    mem_undershoot_ratio = 0.9
+    mem_limit = "{}M".format(int(1e3 * mem_gb * mem_undershoot_ratio))
+    mem_guarantee = "{}M".format(int(1e3 * mem_gb * mem_undershoot_ratio))
+    kubespawner_override['cpu_limit'] = cpu_limit
+    kubespawner_override['cpu_guarantee'] = cpu_guarantee
+    kubespawner_override['mem_limit'] = mem_limit
+    kubespawner_override['mem_guarantee'] = mem_guarantee
+    extra_resource_limits = {}
+    if gpu:
+        extra_resource_limits['nvidia.com/gpu'] = gpu
+    else:
+        extra_resource_limits['nvidia.com/gpu'] = '0'
+    kubespawner_override['extra_resource_limits'] = extra_resource_limits
+
+    # the nodegroup mounts the NVMe disks where the kubelet keeps emptyDir volumes
+    instance_storage = parse_instance_storage(storage)
+    if instance_store_scratch and instance_storage:
+        _, storage_gb = instance_storage
+        storage_undershoot_ratio = 0.9
+        scratch_limit = "{}G".format(int(storage_gb * storage_undershoot_ratio))
+        kubespawner_override['volumes'] = [{ 'name' : 'scratch', 'emptyDir' : { 'sizeLimit' : scratch_limit } }]
+        kubespawner_override['volume_mounts'] = [{ 'name' : 'scratch', 'mountPath' : scratch_mount_path }]
+
+    profile['kubespawner_override'] = kubespawner_override
+
+    return profile
+
+def apply_profile_defaults(profile, defaults):
+    new_profile = deepcopy(defaults)
+    recursive_dict_copy(profile, new_profile)
+    # keep the default volumes (e.g. home directories) next to the profile's own
+    default_override = defaults.get('kubespawner_override', {})
+    profile_override = profile.get('kubespawner_override', {})
+    for key in ['volumes', 'volume_mounts']:
+        if key in default_override.keys() and key in profile_override.keys():
+            new_profile['kubespawner_override'][key] = deepcopy(default_override[key]) + deepcopy(profile_override[key])
+    return new_profile
+
+def format_profile(profile, region):
+    if 'display_name' in profile.keys():
+        instance_name_fmt = profile['display_name'].replace(".", "-")
+    else:
+        instance_name_fmt = ""
+
+    region_fmt = region
+
+    def profile_formatter(value):
+        return value.format(
+            instance_name=instance_name_fmt,
+            display_name=instance_name_fmt,
+            region=region_fmt,
+        )
+    formatted_profile = deepcopy(profile)
+    formatted_profile = recursive_rename_values_in_object(formatted_profile, profile_formatter)
+    
+    return formatted_profile
+
+# filters are display name patterns (e.g. "p3-*") allowed for users or groups
+# users not mentioned in the filters (directly or through a group) get every profile
+def filter_profiles(profiles, filters, user_name, group_names):
+    patterns = list(filters.get('users', {}).get(user_name, []))
+    for group_name in group_names:
+        patterns += filters.get('groups', {}).get(group_name, [])
+    if len(patterns) == 0 and not filters.get('restricted', False):
+        return profiles
+    filtered_profiles = [profile for profile in profiles if any([fnmatch(profile['display_name'], pattern) for pattern in patterns])]
+    # KubeSpawner falls back to its default server for an empty profile list, so refuse to spawn instead
+    if len(filtered_profiles) == 0:
+        raise Exception(f"User {user_name} is not allowed to use any of the profiles on this hub. Ask an administrator for access.")
+    return filtered_profiles
+
+def make_profiles_from_catalog(catalog):
+    profiles = []
+    for instance_name, instance_info in catalog['instances'].items():
+        profile = make_profile(instance_name, instance_info, instance_store_scratch=instance_name in catalog['instanceStoreScratch'])
+        if profile['display_name'] in catalog['profileOverrides'].keys():
+            recursive_dict_copy(catalog['profileOverrides'][profile['display_name']], profile)
+        profile = apply_profile_defaults(profile, catalog['hubDefaults'])
+        profiles.append(format_profile(profile, catalog['region']))
+    return profiles
+
+# returns a KubeSpawner profile_list callable building the profiles from the
+# catalog file, rebuilt only when the catalog file changes
+def make_profile_list_callable(catalog_file):
+    cache = {}
+
+    def profile_list(spawner):
+        try:
+            modified = os.stat(catalog_file).st_mtime
+        except FileNotFoundError:
+            raise Exception(f"The profile catalog {catalog_file} does not exist. Set profile-catalog in the chart values to the profile-catalog of the hub configuration made with dynamicProfiles: true.")
+        if cache.get('modified') != modified:
+            with open(catalog_file, "r") as f:
+                catalog = json.load(f)
+            cache['profiles'] = make_profiles_from_catalog(catalog)
+            cache['filters'] = catalog['filters']
+            cache['modified'] = modified
+
+        user_name = spawner.user.name
+        group_names = [group.name for group in spawner.user.groups]
+        profiles = filter_profiles(cache['profiles'], cache['filters'], user_name, group_names)
+        # the spawn page adds an index to each profile, so hand out copies
+        return [dict(profile) for profile in profiles]
+
+    return profile_list
+
+# whether a node with these labels satisfies a profile's node_affinity_required
+# the terms are ORed, the match expressions within a term are ANDed
+def node_affinity_matches(node_affinity_required, labels):
+    def expression_matches(expression):
+        operator = expression['operator']
+        key = expression['key']
+        if operator == 'In':
+            return labels.get(key) in expression['values']
+        elif operator == 'NotIn':
+            return labels.get(key) not in expression['values']
+        elif operator == 'Exists':
+            return key in labels.keys()
+        elif operator == 'DoesNotExist':
+            return key not in labels.keys()
+        else:
+            raise Exception(f"Unsupported node affinity operator {operator}")
+
+    return any([all([expression_matches(expression) for expression in term.get('matchExpressions', [])]) for term in node_affinity_required])
+
+# everything needed by make_profile_list_callable, in dependency order
+profile_list_functions = [
+    parse_memory_gib,
+    parse_instance_storage,
+    recursive_dict_copy,
+    recursive_rename_values_in_object,
+    make_profile,
+    apply_profile_defaults,
+    format_profile,
+    filter_profiles,
+    make_profiles_from_catalog,
+    make_profile_list_callable,
+]
+
+# the hub.extraConfig snippet setting KubeSpawner's profile_list to a callable
+# that reads the catalog mounted into the hub
+def make_profile_list_snippet(catalog_file):
+    from inspect import getsource
+    snippet = [
+        "import json",
+        "import re",
+        "import os",
+        "from fnmatch import fnmatch",
+        "from copy import deepcopy",
+    ]
+    for function in profile_list_functions:
+        snippet.append(getsource(function))
+    snippet.append(f"scratch_mount_path = {json.dumps(scratch_mount_path)}")
+    snippet.append(f"c.KubeSpawner.profile_list = make_profile_list_callable({json.dumps(catalog_file)})")
+    return "\n".join(snippet)
@@ -1,21 +1,61 @@
-import yaml
-try:
-    from yaml import CLoader as yamlLoader, CDumper as yamlDumper
-except ImportError:
-    from yaml import Loader as yamlLoader, Dumper as yamlDumper
+import re
+
+# PyYAML is imported on first use to keep importing aws_hub fast
+def get_yaml():
+    import yaml
+    try:
+        from yaml import CLoader as yamlLoader, CDumper as yamlDumper
+    except ImportError:
+        from yaml import Loader as yamlLoader, Dumper as yamlDumper
+    return yaml, yamlLoader, yamlDumper
 
 # Loads data into memory from a YAML string
-def load_yaml(data_str, Loader=yamlLoader):
-    return yaml.load(data_str, Loader=Loader)
+def load_yaml(data_str, Loader=None):
+    yaml, yamlLoader, _ = get_yaml()
+    return yaml.load(data_str, Loader=Loader or yamlLoader)
 
-def load_yaml_from_file(filename, Loader=yamlLoader):
+def load_yaml_from_file(filename, Loader=None):
     with open(filename, "r") as yaml_file:
         file_data = yaml_file.read()
         return load_yaml(file_data, Loader=Loader)
 
 # Dumps data stored as dictionaries and lists into a a YAML string
-def dump_yaml(data, Dumper=yamlDumper):
-    return yaml.dump(data, Dumper=Dumper)
+def dump_yaml(data, Dumper=None):
+    yaml, _, yamlDumper = get_yaml()
+    return yaml.dump(data, Dumper=Dumper or yamlDumper)
+
+# Parses a memory description such as "1,952 GiB" into a number of GiB
+def parse_memory_gib(mem_str):
+    return float(mem_str.split(" ")[0].replace(",", ""))
+
+# Parses an instance storage description such as "2 x 1,900 NVMe SSD" into
+# the number of NVMe instance store disks and their total size in GB
+# returns None for instances without NVMe instance storage (e.g. "EBS only")
+def parse_instance_storage(storage_str):
+    match = re.match(r"\s*(\d+) x ([\d,.]+) (GB |TB )?NVMe SSD", storage_str or "")
+    if not match:
+        return None
+    num_disks = int(match.group(1))
+    disk_size = float(match.group(2).replace(",", ""))
+    # the Pricing API gives some sizes in TB without a unit (e.g. "8 x 1.9 NVMe SSD"),
+    # no NVMe instance store disk is smaller than 10 GB or larger than 10 TB
+    if match.group(3) == "TB " or (match.group(3) is None and disk_size < 10):
+        disk_size *= 1000
+    return num_disks, num_disks * disk_size
+
+# The CPU architecture of a physical processor description such as "AWS Graviton2 Processor"
+# or "Intel Xeon Platinum 8175", None if it is unknown
+def get_processor_architecture(physical_processor):
+    physical_processor = physical_processor or ""
+    if "Graviton" in physical_processor:
+        return "arm64"
+    if "Intel" in physical_processor or "AMD" in physical_processor:
+        return "x86_64"
+    return None
+
+# Burstable instance families (t2, t3, t3a, t4g) run on CPU credits
+def is_burstable_instance(instance_name):
+    return re.match(r"t\d", instance_name) is not None
 
 def recursive_dict_copy(source, target):
     for key, value in source.items():
@@ -0,0 +1,156 @@
+from .utils import load_yaml_from_file
+from .ec2_instance_information import make_boto3_client
+import sys
+
+# plan which nodegroups should keep warm nodes during which hours of the day
+# process:
+# - read a usage history of average spawns per profile per hour of the day (UTC)
+# - rank (profile, hour, node) candidates by spawns served per dollar
+# - keep adding warm nodes until the daily budget is used up
+# - turn the hourly plan into a static minSize and a set of scheduled scaling actions
+#   (put-scheduled-update-group-action inputs) for the nodegroups' Auto Scaling Groups
+
+hours_in_day = 24
+# every scheduled action made here starts with this, so re-applying a schedule can replace them
+scheduled_action_prefix = "aws-hub-warm-"
+
+def load_usage_history(filename):
+    # usage history is a YAML (or JSON) mapping of
+    # profile display name -> hour of day (0-23, UTC) -> average number of spawns
+    usage_history = load_yaml_from_file(filename)
+    if not usage_history:
+        return {}
+
+    parsed_usage_history = {}
+    for profile, hourly_spawns in usage_history.items():
+        parsed_usage_history[profile] = [0.] * hours_in_day
+        for hour, spawns in hourly_spawns.items():
+            hour = int(hour)
+            if hour < 0 or hour >= hours_in_day:
+                raise Exception(f"Invalid hour {hour} for profile {profile} in usage history {filename}")
+            parsed_usage_history[profile][hour] = float(spawns)
+
+    return parsed_usage_history
+
+def plan_warm_capacity(usage_history, nodegroup_prices, budget, min_spawns_per_hour=1, max_warm_nodes=1):
+    # usage_history: profile -> list of spawns for each hour of the day
+    # nodegroup_prices: profile -> (nodegroup name, price per hour) of the cheapest nodegroup
+    # whose nodes the profile's pods can be scheduled on
+    # budget: dollars per day to spend on warm nodes
+    # returns nodegroup name -> list of warm nodes for each hour of the day
+    candidates = []
+    for profile, hourly_spawns in usage_history.items():
+        if profile not in nodegroup_prices.keys():
+            print(f"WARNING: no nodegroup serves profile {profile} from the usage history.", file=sys.stderr)
+            continue
+        nodegroup_name, price = nodegroup_prices[profile]
+        for hour, spawns in enumerate(hourly_spawns):
+            if spawns < min_spawns_per_hour:
+                continue
+            # every profile claims (almost) a whole node, so the k-th warm node
+            # serves at most one of the spawns in that hour
+            for k in range(max_warm_nodes):
+                spawns_served = min(spawns - k, 1.)
+                if spawns_served <= 0:
+                    break
+                candidates.append((spawns_served / max(price, 1e-6), nodegroup_name, hour, k, price))
+
+    # most spawns served per dollar first, ties broken deterministically
+    candidates = sorted(candidates, key=lambda x : (-x[0], x[1], x[2], x[3]))
+
+    warm_nodes = {}
+    cost = 0.
+    for _, nodegroup_name, hour, k, price in candidates:
+        if cost + price > budget:
+            continue
+        if nodegroup_name not in warm_nodes.keys():
+            warm_nodes[nodegroup_name] = [0] * hours_in_day
+        # the k-th node for an hour is only worth it if the (k-1)-th one was kept
+        if warm_nodes[nodegroup_name][hour] != k:
+            continue
+        warm_nodes[nodegroup_name][hour] += 1
+        cost += price
+
+    print(f"INFO: Warm capacity plan costs ${cost:.2f}/day of a ${budget:.2f}/day budget.", file=sys.stderr)
+
+    return warm_nodes
+
+def make_scaling_schedule(warm_nodes, base_sizes):
+    # warm_nodes: nodegroup name -> list of warm nodes for each hour of the day
+    # base_sizes: nodegroup name -> minSize the nodegroup was configured with
+    # returns nodegroup name -> static minSize, and the scheduled actions for the rest of the day
+    static_sizes = {}
+    scheduled_actions = []
+    for nodegroup_name, hourly_nodes in sorted(warm_nodes.items()):
+        base_size = base_sizes.get(nodegroup_name, 0)
+        hourly_sizes = [max(base_size, nodes) for nodes in hourly_nodes]
+        static_sizes[nodegroup_name] = min(hourly_sizes)
+
+        # nothing to schedule if the size never changes during the day
+        if len(set(hourly_sizes)) == 1:
+            continue
+
+        for hour, size in enumerate(hourly_sizes):
+            # the schedule repeats every day, so compare against the previous hour cyclically
+            if size != hourly_sizes[hour - 1]:
+                # the Recurrence of a scheduled action is in UTC
+                # only MinSize is scheduled: the Auto Scaling Group raises its desired capacity to a
+                # larger minimum by itself, while setting DesiredCapacity would terminate busy nodes
+                # once the minimum drops, the cluster autoscaler removes the nodes that are idle
+                scheduled_actions.append({
+                    'nodegroup' : nodegroup_name,
+                    'ScheduledActionName' : f"{scheduled_action_prefix}{hour:02d}",
+                    'Recurrence' : f"0 {hour} * * *",
+                    'MinSize' : size,
+                })
+
+    return static_sizes, scheduled_actions
+
+# eksctl tags the Auto Scaling Group of every nodegroup with its cluster and nodegroup name
+def get_nodegroup_auto_scaling_groups(client, cluster_name):
+    auto_scaling_groups = {}
+    paginator = client.get_paginator('describe_auto_scaling_groups')
+    for page in paginator.paginate():
+        for auto_scaling_group in page['AutoScalingGroups']:
+            tags = { tag['Key'] : tag['Value'] for tag in auto_scaling_group['Tags'] }
+            if tags.get('alpha.eksctl.io/cluster-name') != cluster_name:
+                continue
+            if 'alpha.eksctl.io/nodegroup-name' in tags.keys():
+                auto_scaling_groups[tags['alpha.eksctl.io/nodegroup-name']] = auto_scaling_group['AutoScalingGroupName']
+    return auto_scaling_groups
+
+# replaces the warm capacity scheduled actions of every nodegroup in the cluster
+# with put-scheduled-update-group-action calls on their Auto Scaling Groups
+def apply_scaling_schedule(schedule):
+    client = make_boto3_client("autoscaling", schedule['region'])
+    auto_scaling_groups = get_nodegroup_auto_scaling_groups(client, schedule['clusterName'])
+
+    # nodegroups that dropped out of the plan must not keep scaling up every day
+    for nodegroup_name, auto_scaling_group_name in sorted(auto_scaling_groups.items()):
+        paginator = client.get_paginator('describe_scheduled_actions')
+        for page in paginator.paginate(AutoScalingGroupName=auto_scaling_group_name):
+            for existing_action in page['ScheduledUpdateGroupActions']:
+                if existing_action['ScheduledActionName'].startswith(scheduled_action_prefix):
+                    client.delete_scheduled_action(
+                        AutoScalingGroupName=auto_scaling_group_name,
+                        ScheduledActionName=existing_action['ScheduledActionName'],
+                    )
+
+    actions_by_nodegroup = {}
+    for action in schedule['scheduledActions']:
+        actions_by_nodegroup.setdefault(action['nodegroup'], []).append(action)
+
+    for nodegroup_name, actions in sorted(actions_by_nodegroup.items()):
+        if nodegroup_name not in auto_scaling_groups.keys():
+            print(f"WARNING: no Auto Scaling Group found for nodegroup {nodegroup_name}, skipping its scheduled actions.", file=sys.stderr)
+            continue
+        auto_scaling_group_name = auto_scaling_groups[nodegroup_name]
+
+        for action in actions:
+            client.put_scheduled_update_group_action(
+                AutoScalingGroupName=auto_scaling_group_name,
+                ScheduledActionName=action['ScheduledActionName'],
+                Recurrence=action['Recurrence'],
+                MinSize=action['MinSize'],
+            )
+        print(f"INFO: Applied {len(actions)} scheduled actions to {auto_scaling_group_name}.", file=sys.stderr)
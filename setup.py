@@ -0,0 +1,21 @@
+from setuptools import setup
+
+setup(
+    name="aws_hub",
+    version="0.0.1",
+    description="A JupyterHub on Kubernetes gateway to EC2 instances on AWS",
+    url="https://github.com/dirac-institute/aws-hub",
+    packages=["aws_hub"],
+    python_requires=">=3.9",
+    install_requires=[
+        "boto3",
+        "botocore",
+        "PyYAML",
+    ],
+    entry_points={
+        "console_scripts": [
+            "aws_hub=aws_hub.aws_hub:main",
+            "aws-hub=aws_hub.aws_hub:main",
+        ],
+    },
+)
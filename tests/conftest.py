@@ -0,0 +1,119 @@
+import json
+import pytest
+
+from aws_hub.aws_hub import hubFactory
+
+availability_zones = ['us-west-2a', 'us-west-2b', 'us-west-2c']
+
+intel = "Intel Xeon Platinum 8175"
+amd = "AMD EPYC 7571"
+graviton = "AWS Graviton2 Processor"
+
+def make_instance(vcpu, memory, price, spot_price, storage="EBS only", gpu=None, category="General purpose", processor=intel):
+    return {
+        'on_demand_pricing' : { 'price' : str(price), 'description' : '' },
+        'spot_pricing' : { az : spot_price * (1 + 0.1 * i) if spot_price else None for i, az in enumerate(availability_zones) },
+        'hardware' : {
+            'vcpu' : str(vcpu),
+            'memory' : f"{memory} GiB",
+            'storage' : storage,
+            'gpu' : gpu,
+            'networkPerformance' : 'Up to 10 Gigabit',
+            'instanceFamily' : category,
+            'physicalProcessor' : processor,
+            'clockSpeed' : '',
+        },
+    }
+
+# a small made-up region catalog, in the format of get_all_instance_information_for_region
+# storage is given as the Pricing API does, which lists i3 disks in TB
+def make_region_information():
+    return {
+        'm5.large' : make_instance(2, 8, 0.096, 0.035),
+        'm5.xlarge' : make_instance(4, 16, 0.192, 0.07),
+        'm5a.large' : make_instance(2, 8, 0.086, 0.03, processor=amd),
+        'm6g.large' : make_instance(2, 8, 0.077, 0.029, processor=graviton),
+        't3.large' : make_instance(2, 8, 0.0832, 0.025),
+        'm4.large' : make_instance(2, 8, 0.1, 0.032),
+        'c5.large' : make_instance(2, 4, 0.085, 0.03, category="Compute optimized"),
+        'c5d.large' : make_instance(2, 4, 0.096, 0.032, storage="1 x 50 NVMe SSD", category="Compute optimized"),
+        'c5ad.large' : make_instance(2, 4, 0.086, 0.031, storage="1 x 75 NVMe SSD", category="Compute optimized", processor=amd),
+        'i3.large' : make_instance(2, 15.25, 0.156, 0.05, storage="1 x 0.475 NVMe SSD", category="Storage optimized"),
+        'i3.2xlarge' : make_instance(8, 61, 0.624, 0.2, storage="1 x 1.9 NVMe SSD", category="Storage optimized"),
+    }
+
+@pytest.fixture
+def region_information():
+    return make_region_information()
+
+@pytest.fixture
+def catalog_file(tmp_path):
+    catalog_file = tmp_path / "catalog.json"
+    catalog_file.write_text(json.dumps(make_region_information()))
+    return catalog_file
+
+# a configuration in the style of examples/config.yaml using the cached catalog
+def example_config(catalog_file, **config):
+    return {
+        'config' : dict({
+            'region' : 'us-west-2',
+            'availabilityZones' : ['a', 'b', 'c'],
+            'clusterName' : 'test',
+            'catalog' : str(catalog_file),
+        }, **config),
+        'nodegroupDefaults' : {
+            'name' : "{instance_name}-{region}{availability_zones_short}",
+            'desiredCapacity' : 0,
+            'minSize' : 0,
+            'maxSize' : 100,
+            'labels' : { 'dirac.washington.edu/instance-name' : "{instance_name}" },
+        },
+        'groups' : [
+            {
+                'families' : ['m5', 'c5d', 'i3'],
+                'type' : 'onDemand',
+                'separateAvailabilityZones' : True,
+                'separateInstances' : True,
+                'separateFamilies' : True,
+            },
+            {
+                'families' : ['m5', 'c5d', 'i3'],
+                'type' : 'spot',
+                'separateAvailabilityZones' : True,
+                'separateInstances' : True,
+                'separateFamilies' : True,
+                'nodegroupOverrides' : {
+                    'name' : "{instance_name}-spot-{region}{availability_zones_short}",
+                    'labels' : { 'dirac.washington.edu/instance-name' : "{instance_name}-spot" },
+                },
+            },
+        ],
+        'hubDefaults' : {
+            'kubespawner_override' : {
+                'node_affinity_required' : [{
+                    'matchExpressions' : [{
+                        'key' : 'dirac.washington.edu/instance-name',
+                        'operator' : 'In',
+                        'values' : ["{instance_name}"],
+                    }],
+                }],
+            },
+        },
+    }
+
+# builds example configurations with extra settings in the config section
+@pytest.fixture
+def make_config(catalog_file):
+    def make_config(**config):
+        return example_config(catalog_file, **config)
+    return make_config
+
+# builds configured but not yet processed hubFactory objects
+@pytest.fixture
+def make_factory(make_config):
+    def make_factory(spot_diversification=False, **config):
+        factory = hubFactory()
+        factory.set_configuration(make_config(**config))
+        factory.groups[1]['spotDiversification'] = spot_diversification
+        return factory
+    return make_factory
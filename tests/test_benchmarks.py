@@ -0,0 +1,50 @@
+import json
+from aws_hub.benchmarks import compute_perf_per_dollar
+
+benchmarks = {
+    'm5.large' : { 'cpu' : 100, 'memory_bandwidth' : 20 },
+    'm5.xlarge' : { 'cpu' : 180 },
+    # benchmarked, but not on the benchmarkMetric
+    'i3.large' : { 'memory_bandwidth' : 30 },
+}
+
+def make_profiles(make_factory, tmp_path):
+    benchmarks_file = tmp_path / "benchmarks.json"
+    benchmarks_file.write_text(json.dumps(benchmarks))
+    factory = make_factory(benchmarks=str(benchmarks_file))
+    factory.create_hub_config()
+    profiles = factory.hub_config['jupyterhub']['singleuser']['profileList']
+    return factory, { profile['display_name'] : profile for profile in profiles }
+
+def test_compute_perf_per_dollar():
+    perf_per_dollar = compute_perf_per_dollar(benchmarks, { 'm5.large' : 0.1, 'm5.xlarge' : 0.2, 'i3.large' : None })
+    # instances without a price are left out
+    assert perf_per_dollar == {
+        'm5.large' : { 'cpu' : 1000., 'memory_bandwidth' : 200. },
+        'm5.xlarge' : { 'cpu' : 900. },
+    }
+
+def test_benchmarked_profiles(make_factory, tmp_path):
+    factory, profiles = make_profiles(make_factory, tmp_path)
+    aws = profiles['m5-large']['aws']
+    assert aws['benchmarks'] == { 'cpu' : 100., 'memory_bandwidth' : 20. }
+    assert aws['perf_per_dollar'] == { 'cpu' : round(100 / 0.096, 2), 'memory_bandwidth' : round(20 / 0.096, 2) }
+    assert aws['perf_per_dollar_score'] == round(100 / 0.096, 2)
+    spot_price = factory.region_information['m5.large']['spot_pricing']['maxPrice']
+    assert aws['spot_perf_per_dollar']['cpu'] == round(100 / spot_price, 2)
+
+def test_best_perf_per_dollar_in_family(make_factory, tmp_path):
+    _, profiles = make_profiles(make_factory, tmp_path)
+    # 100 / $0.096 beats 180 / $0.192
+    assert profiles['m5-large']['aws']['best_perf_per_dollar'] is True
+    assert 'best_perf_per_dollar' not in profiles['m5-xlarge']['aws'].keys()
+    # without a cpu score i3.large cannot be the best of its family
+    assert profiles['i3-large']['aws']['benchmarks'] == { 'memory_bandwidth' : 30. }
+    assert 'perf_per_dollar_score' not in profiles['i3-large']['aws'].keys()
+    assert 'best_perf_per_dollar' not in profiles['i3-large']['aws'].keys()
+
+def test_profiles_without_benchmarks(make_factory, tmp_path):
+    _, profiles = make_profiles(make_factory, tmp_path)
+    aws = profiles['c5d-large']['aws']
+    for key in ['benchmarks', 'perf_per_dollar', 'spot_perf_per_dollar', 'perf_per_dollar_score', 'best_perf_per_dollar']:
+        assert key not in aws.keys()
@@ -0,0 +1,54 @@
+import os
+from aws_hub.utils import load_yaml_from_file
+
+def make_shards(make_factory, max_nodegroups_per_shard):
+    factory = make_factory(maxNodegroupsPerShard=max_nodegroups_per_shard)
+    factory.create_eksctl_shards()
+    return factory
+
+def test_every_nodegroup_is_in_one_shard_of_its_family_and_availability_zones(make_factory):
+    factory = make_shards(make_factory, 2)
+    shards, manifest = factory.eksctl_shards
+    nodegroups = { nodegroup['name'] : nodegroup for nodegroup in factory.processed_nodegroups }
+
+    shard_nodegroup_names = sum([shard['nodegroups'] for shard in manifest['shards']], [])
+    assert sorted(shard_nodegroup_names) == sorted(nodegroups.keys())
+
+    for shard in manifest['shards']:
+        assert 1 <= len(shard['nodegroups']) <= 2
+        instances = [factory.get_nodegroup_instance(nodegroups[name]) for name in shard['nodegroups']]
+        assert len(set([instance.split(".")[0] for instance in instances])) == 1
+        assert len(set([tuple(nodegroups[name]['availabilityZones']) for name in shard['nodegroups']])) == 1
+        # the shard file holds exactly the nodegroups listed in the manifest
+        assert [nodegroup['name'] for nodegroup in shards[shard['file']]['nodeGroups']] == shard['nodegroups']
+        assert shard['command'] == f"eksctl create nodegroup -f {shard['file']}"
+
+def test_large_groups_are_split(make_factory):
+    _, manifest = make_shards(make_factory, 2).eksctl_shards
+    shards = { shard['name'] : shard['nodegroups'] for shard in manifest['shards'] }
+    # the m5.large and m5.xlarge on-demand and m5.large Spot nodegroups of us-west-2a
+    assert shards['m5-a-0'] == ['m5-large-us-west-2a', 'm5-xlarge-us-west-2a']
+    assert shards['m5-a-1'] == ['m5-large-spot-us-west-2a']
+
+    _, manifest = make_shards(make_factory, 20).eksctl_shards
+    shards = { shard['name'] : shard['nodegroups'] for shard in manifest['shards'] }
+    assert shards['m5-a-0'] == ['m5-large-us-west-2a', 'm5-xlarge-us-west-2a', 'm5-large-spot-us-west-2a']
+    assert 'm5-a-1' not in shards.keys()
+
+def test_cluster_config_has_no_nodegroups(make_factory):
+    shards, manifest = make_shards(make_factory, 20).eksctl_shards
+    assert manifest['cluster'] == {
+        'file' : "cluster.yaml",
+        'command' : "eksctl create cluster -f cluster.yaml --without-nodegroup",
+    }
+    cluster_config = shards['cluster.yaml']
+    assert cluster_config['nodeGroups'] == []
+    assert cluster_config['metadata'] == { 'name' : 'test', 'region' : 'us-west-2' }
+    assert cluster_config['availabilityZones'] == ['us-west-2a', 'us-west-2b', 'us-west-2c']
+
+def test_dump_writes_the_shards_and_manifest(make_factory, tmp_path):
+    factory = make_shards(make_factory, 20)
+    factory.dump_eksctl_shards(str(tmp_path / "cluster"))
+    shards, manifest = factory.eksctl_shards
+    assert sorted(os.listdir(tmp_path / "cluster")) == sorted(list(shards.keys()) + ["manifest.yaml"])
+    assert load_yaml_from_file(str(tmp_path / "cluster" / "manifest.yaml")) == manifest
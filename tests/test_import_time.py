@@ -0,0 +1,39 @@
+import json
+import subprocess
+import sys
+import os
+
+repository = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# importing and generating offline from a cached catalog should take less than this
+# (measured inside the interpreter, its own startup time is not counted)
+target_seconds = 0.1
+
+def run_python(code, cwd):
+    env = dict(os.environ, PYTHONPATH=repository)
+    result = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True, check=True)
+    return result.stdout
+
+def test_import_does_not_load_heavy_dependencies(tmp_path):
+    loaded = run_python(
+        "import sys, aws_hub.aws_hub; "
+        "print(' '.join(m for m in ['boto3', 'botocore', 'pkg_resources', 'yaml'] if m in sys.modules))",
+        tmp_path
+    )
+    assert loaded.strip() == ""
+
+def test_offline_generation_time(tmp_path, make_config):
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps(make_config()))
+    elapsed = run_python(
+        "import sys, time\n"
+        "start = time.perf_counter()\n"
+        "from aws_hub import aws_hub\n"
+        f"sys.argv = ['aws_hub', '--file', {str(config_file)!r}, '--eksctl_out', 'cluster.yaml', '--hub_out', 'profiles.yaml']\n"
+        "aws_hub.main()\n"
+        "print(time.perf_counter() - start)\n",
+        tmp_path
+    )
+    assert (tmp_path / "cluster.yaml").exists()
+    assert (tmp_path / "profiles.yaml").exists()
+    assert float(elapsed) < target_seconds
@@ -0,0 +1,44 @@
+import pytest
+from aws_hub.aws_hub import parse_range
+from aws_hub.instance_selector import instanceSelector
+
+def test_open_ranges(region_information):
+    selector = instanceSelector(region_information)
+    assert selector.select(memory=(16, None)) == ['m5.xlarge', 'i3.2xlarge']
+    assert selector.select(price=(None, 0.085)) == ['m6g.large', 't3.large', 'c5.large']
+
+def test_closed_ranges_are_cheapest_first(region_information):
+    selector = instanceSelector(region_information)
+    assert selector.select(vcpu=(2, 2), memory=(8, 8), price=(None, 0.09)) == ['m6g.large', 't3.large', 'm5a.large']
+
+def test_empty_result(region_information):
+    selector = instanceSelector(region_information)
+    assert selector.select(vcpu=(100, None)) == []
+    assert selector.select(memory=(8, 4)) == []
+    assert selector.select(families=['p3']) == []
+
+def test_families(region_information):
+    selector = instanceSelector(region_information)
+    # c5ad is a family of its own
+    assert selector.select(families=['c5', 'c5d']) == ['c5.large', 'c5d.large']
+
+def test_availability_zones(region_information):
+    region_information['i3.large']['spot_pricing']['us-west-2c'] = None
+    # hubFactory adds maxPrice next to the availability zone prices
+    region_information['i3.large']['spot_pricing']['maxPrice'] = 0.2
+    selector = instanceSelector(region_information)
+    assert selector.select(families=['i3'], availability_zones=['us-west-2c']) == ['i3.2xlarge']
+    assert selector.select(families=['i3'], availability_zones=['us-west-2a']) == ['i3.large', 'i3.2xlarge']
+    assert selector.select(families=['i3'], spot_availability_zones=(3, None)) == ['i3.2xlarge']
+
+def test_invalid_attribute(region_information):
+    selector = instanceSelector(region_information)
+    with pytest.raises(Exception, match="Cannot select on storage"):
+        selector.select(storage=(1, None))
+
+def test_parse_range():
+    assert parse_range("64:") == (64, None)
+    assert parse_range(":3") == (None, 3)
+    assert parse_range("2:4") == (2, 4)
+    # a single number is a minimum
+    assert parse_range("1") == (1, None)
@@ -0,0 +1,69 @@
+import json
+from aws_hub import ec2_instance_information
+from aws_hub.ec2_instance_information import get_instance_storage_for_region
+from aws_hub.profiles import make_profiles_from_catalog
+
+def make_hub_config(make_factory, **config):
+    factory = make_factory(spot_diversification=True, **config)
+    factory.create_hub_config()
+    return factory
+
+def get_nodegroup(factory, name):
+    return [nodegroup for nodegroup in factory.processed_nodegroups if nodegroup['name'] == name][0]
+
+def has_scratch(profile):
+    return 'scratch' in [volume['name'] for volume in profile['kubespawner_override'].get('volumes', [])]
+
+def test_spot_substitutes_match_instance_storage(make_factory):
+    factory = make_hub_config(make_factory)
+    # c5.large has no instance storage and c5ad.large has more than c5d.large
+    instance_types = get_nodegroup(factory, "c5d-large-spot-us-west-2a")['instancesDistribution']['instanceTypes']
+    assert 'c5ad.large' in instance_types
+    assert 'c5.large' not in instance_types
+    # m5.large substitutes never have instance storage
+    instance_types = get_nodegroup(factory, "m5-large-spot-us-west-2a")['instancesDistribution']['instanceTypes']
+    assert not any(instance.startswith("c5") or instance.startswith("i3") for instance in instance_types)
+
+def test_profiles_get_scratch_only_with_mounted_nodegroups(make_factory):
+    factory = make_hub_config(make_factory)
+    profiles = { profile['display_name'] : profile for profile in factory.hub_config['jupyterhub']['singleuser']['profileList'] }
+    assert 'preBootstrapCommands' in get_nodegroup(factory, "c5d-large-us-west-2a").keys()
+    assert has_scratch(profiles["c5d-large"])
+    assert not has_scratch(profiles["m5-large"])
+
+def test_catalog_profiles_get_scratch_only_with_mounted_nodegroups(make_factory):
+    factory = make_hub_config(make_factory, dynamicProfiles=True)
+    catalog = json.loads(factory.hub_config['profile-catalog'])
+    profiles = { profile['display_name'] : profile for profile in make_profiles_from_catalog(catalog) }
+    assert has_scratch(profiles["c5d-large"])
+    assert not has_scratch(profiles["m5-large"])
+
+def test_no_scratch_when_turned_off(make_factory):
+    factory = make_hub_config(make_factory, instanceStoreScratch=False)
+    profiles = factory.hub_config['jupyterhub']['singleuser']['profileList']
+    assert not any(has_scratch(profile) for profile in profiles)
+    assert not any('preBootstrapCommands' in nodegroup.keys() for nodegroup in factory.processed_nodegroups)
+
+def test_scratch_size_limit_from_storage_in_terabytes(make_factory):
+    factory = make_hub_config(make_factory)
+    profiles = { profile['display_name'] : profile for profile in factory.hub_config['jupyterhub']['singleuser']['profileList'] }
+    # "1 x 0.475 NVMe SSD" is 475 GB
+    assert profiles["i3-large"]['kubespawner_override']['volumes'] == [{ 'name' : 'scratch', 'emptyDir' : { 'sizeLimit' : "427G" } }]
+
+class fakeInstanceTypesClient():
+    def get_paginator(self, operation):
+        class paginator():
+            def paginate(self, **kwargs):
+                return [{ 'InstanceTypes' : [
+                    { 'InstanceType' : 'i3.16xlarge', 'InstanceStorageInfo' : {
+                        'TotalSizeInGB' : 15200, 'Disks' : [{ 'SizeInGB' : 1900, 'Count' : 8, 'Type' : 'ssd' }], 'NvmeSupport' : 'required',
+                    } },
+                    { 'InstanceType' : 'd2.xlarge', 'InstanceStorageInfo' : {
+                        'TotalSizeInGB' : 6000, 'Disks' : [{ 'SizeInGB' : 2000, 'Count' : 3, 'Type' : 'hdd' }], 'NvmeSupport' : 'unsupported',
+                    } },
+                ] }]
+        return paginator()
+
+def test_instance_storage_comes_from_ec2_in_gigabytes(monkeypatch):
+    monkeypatch.setattr(ec2_instance_information, 'make_boto3_client', lambda client_type, region : fakeInstanceTypesClient())
+    assert get_instance_storage_for_region('us-west-2') == { 'i3.16xlarge' : "8 x 1900 GB NVMe SSD" }
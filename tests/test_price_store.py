@@ -0,0 +1,66 @@
+import datetime
+from aws_hub import ec2_instance_information
+from aws_hub.ec2_instance_information import get_spot_price_for_instance_names
+from aws_hub.price_store import priceStore
+
+now = datetime.datetime.now(datetime.timezone.utc)
+availability_zones = ['us-west-2a', 'us-west-2b']
+
+# a Spot price history where m5.large has not changed price in days
+spot_price_history = [
+    ('m5.large', 'us-west-2a', now - datetime.timedelta(days=3), "0.035"),
+    ('m5.large', 'us-west-2b', now - datetime.timedelta(days=3), "0.037"),
+    ('m5.xlarge', 'us-west-2a', now - datetime.timedelta(days=3), "0.07"),
+    ('m5.xlarge', 'us-west-2a', now - datetime.timedelta(hours=2), "0.08"),
+]
+
+# like AWS, returns the changes after StartTime and the price in effect at StartTime
+class fakePaginator():
+    def paginate(self, InstanceTypes, ProductDescriptions, StartTime, EndTime):
+        records = {}
+        for instance_type, availability_zone, timestamp, price in sorted(spot_price_history, key=lambda x : x[2]):
+            if instance_type not in InstanceTypes or timestamp > EndTime:
+                continue
+            record = { 'InstanceType' : instance_type, 'AvailabilityZone' : availability_zone, 'Timestamp' : timestamp, 'SpotPrice' : price }
+            if timestamp <= StartTime:
+                records[(instance_type, availability_zone)] = [record]
+            else:
+                records.setdefault((instance_type, availability_zone), []).append(record)
+        return [{ 'SpotPriceHistory' : sum(records.values(), []) }]
+
+class fakeClient():
+    def get_paginator(self, name):
+        return fakePaginator()
+
+def test_stable_prices_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(ec2_instance_information, 'make_boto3_client', lambda client_type, region : fakeClient())
+    price_store = priceStore(str(tmp_path / "prices.sqlite"))
+    instance_names = ['m5.large', 'm5.xlarge']
+
+    # the first run and a delta run starting at the high water mark
+    for _ in range(2):
+        spot_data = get_spot_price_for_instance_names('us-west-2', availability_zones, instance_names, price_store=price_store)
+        assert spot_data['m5.large']['us-west-2a'] == 0.035
+        assert spot_data['m5.large']['us-west-2b'] == 0.037
+        assert spot_data['m5.xlarge']['us-west-2a'] == (0.07 + 0.08) / 2
+        assert spot_data['m5.xlarge']['us-west-2b'] is None
+
+    statistics = price_store.get_spot_price_statistics('m5.large', 'us-west-2a', "Linux/UNIX", 7, now.timestamp())
+    assert statistics['mean'] == 0.035
+    assert statistics['p95'] == 0.035
+    assert statistics['volatility'] == 0.
+
+def test_current_price_outside_the_window(tmp_path):
+    price_store = priceStore(str(tmp_path / "prices.sqlite"))
+    stable_since = (now - datetime.timedelta(days=30)).timestamp()
+    # m5.large was confirmed by a fetch an hour ago, m5.xlarge has not been offered for weeks
+    price_store.add_spot_prices('us-west-2', "Linux/UNIX", ['m5.xlarge'], [('m5.xlarge', 'us-west-2a', stable_since, 0.07)], stable_since)
+    price_store.add_spot_prices('us-west-2', "Linux/UNIX", ['m5.large'], [], (now - datetime.timedelta(hours=1)).timestamp(),
+                                confirmed_records=[('m5.large', 'us-west-2a', stable_since, 0.035)])
+
+    spot_data = price_store.get_mean_spot_prices("Linux/UNIX", availability_zones, (now - datetime.timedelta(days=1)).timestamp())
+    assert spot_data == { 'm5.large' : { 'us-west-2a' : 0.035 } }
+    statistics = price_store.get_spot_price_statistics('m5.large', 'us-west-2a', "Linux/UNIX", 7, now.timestamp())
+    assert statistics['mean'] == 0.035
+    assert statistics['volatility'] == 0.
+    assert price_store.get_spot_price_statistics('m5.xlarge', 'us-west-2a', "Linux/UNIX", 7, now.timestamp()) is None
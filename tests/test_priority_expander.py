@@ -0,0 +1,37 @@
+import re
+from aws_hub.utils import load_yaml
+
+def name_regex(name):
+    return ".*-nodegroup-" + re.escape(name) + "-NodeGroup-.*"
+
+def test_every_nodegroup_has_exactly_one_priority(make_factory):
+    factory = make_factory(priorityExpander=True)
+    factory.create_hub_config()
+    priorities = load_yaml(factory.hub_config['cluster-autoscaler-priority-expander']['priorities'])
+    regexes = sum(priorities.values(), [])
+    assert len(regexes) == len(set(regexes))
+    assert len(regexes) == len(factory.processed_nodegroups)
+
+def test_diversified_nodegroups_are_priced_over_all_their_pools(make_factory):
+    factory = make_factory(spot_diversification=True, priorityExpander=True)
+    factory.create_hub_config()
+    nodegroup = [nodegroup for nodegroup in factory.processed_nodegroups if nodegroup['name'] == "m5-large-spot-us-west-2a"][0]
+    instance_types = nodegroup['instancesDistribution']['instanceTypes']
+    assert 'm5a.large' in instance_types
+
+    # m5a.large and m4.large are cheaper than m5.large, so the nodegroup is cheaper than its first instance type
+    region_information = factory.region_information
+    spot_prices = [region_information[instance]['spot_pricing']['us-west-2a'] for instance in instance_types]
+    assert factory.get_nodegroup_price(nodegroup) == sum(spot_prices) / len(spot_prices)
+    assert factory.get_nodegroup_price(nodegroup) < region_information['m5.large']['spot_pricing']['us-west-2a']
+
+def test_ties_are_broken_by_the_nodegroups_own_availability_zones(make_factory):
+    factory = make_factory(priorityExpander=True)
+    factory.create_hub_config()
+    nodegroups = [
+        { 'name' : "m5-large-us-west-2a", 'instanceType' : 'm5.large', 'availabilityZones' : ['us-west-2a'] },
+        { 'name' : "m5-large-us-west-2abc", 'instanceType' : 'm5.large', 'availabilityZones' : ['us-west-2a', 'us-west-2b', 'us-west-2c'] },
+    ]
+    priorities = factory.create_priority_expander_priorities(nodegroups)
+    levels = { regex : level for level, regexes in priorities.items() for regex in regexes }
+    assert levels[name_regex("m5-large-us-west-2abc")] > levels[name_regex("m5-large-us-west-2a")]
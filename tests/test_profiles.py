@@ -0,0 +1,32 @@
+import pytest
+from types import SimpleNamespace
+from aws_hub.profiles import make_profile_list_callable
+
+def make_spawner(user_name, group_names=[]):
+    groups = [SimpleNamespace(name=group_name) for group_name in group_names]
+    return SimpleNamespace(user=SimpleNamespace(name=user_name, groups=groups))
+
+def write_profile_catalog(make_factory, tmp_path, profile_filters):
+    factory = make_factory(dynamicProfiles=True, profileFilters=profile_filters)
+    factory.create_hub_config()
+    profile_catalog_file = tmp_path / "profile-catalog.json"
+    profile_catalog_file.write_text(factory.hub_config['profile-catalog'])
+    return profile_catalog_file
+
+def test_filtered_users_see_their_profiles(make_factory, tmp_path):
+    profile_filters = { 'restricted' : True, 'groups' : { 'students' : ["m5-*"] } }
+    profile_list = make_profile_list_callable(write_profile_catalog(make_factory, tmp_path, profile_filters))
+    profiles = profile_list(make_spawner("alice", ["students"]))
+    assert len(profiles) > 0
+    assert all(profile['display_name'].startswith("m5-") for profile in profiles)
+
+def test_restricted_users_without_profiles_cannot_spawn(make_factory, tmp_path):
+    profile_filters = { 'restricted' : True, 'groups' : { 'students' : ["m5-*"] } }
+    profile_list = make_profile_list_callable(write_profile_catalog(make_factory, tmp_path, profile_filters))
+    with pytest.raises(Exception, match="not allowed"):
+        profile_list(make_spawner("mallory"))
+
+def test_missing_catalog_is_reported(tmp_path):
+    profile_list = make_profile_list_callable(str(tmp_path / "missing.json"))
+    with pytest.raises(Exception, match="profile-catalog"):
+        profile_list(make_spawner("alice"))
@@ -0,0 +1,21 @@
+def get_instance_types(factory, name):
+    nodegroup = [nodegroup for nodegroup in factory.processed_nodegroups if nodegroup['name'] == name][0]
+    return nodegroup['instancesDistribution']['instanceTypes']
+
+def test_substitutes_have_the_same_architecture(make_factory):
+    factory = make_factory(spot_diversification=True)
+    factory.process_groups()
+    instance_types = get_instance_types(factory, "m5-large-spot-us-west-2a")
+    # m5a.large (AMD) runs the same images as m5.large (Intel), m6g.large (Graviton) does not
+    assert 'm5a.large' in instance_types
+    assert 'm6g.large' not in instance_types
+
+def test_burstable_substitutes_need_opting_in(make_factory):
+    factory = make_factory(spot_diversification=True)
+    factory.process_groups()
+    assert 't3.large' not in get_instance_types(factory, "m5-large-spot-us-west-2a")
+
+    factory = make_factory(spot_diversification=True)
+    factory.groups[1]['spotBurstableSubstitutes'] = True
+    factory.process_groups()
+    assert 't3.large' in get_instance_types(factory, "m5-large-spot-us-west-2a")
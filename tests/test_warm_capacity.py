@@ -0,0 +1,88 @@
+import json
+import pytest
+
+from aws_hub.warm_capacity import make_scaling_schedule
+
+def make_warm_factory(make_factory, tmp_path, usage_history, budget=10):
+    usage_history_file = tmp_path / "usage.json"
+    usage_history_file.write_text(json.dumps(usage_history))
+    return make_factory(warmCapacity={ 'usageHistory' : str(usage_history_file), 'budget' : budget })
+
+def test_warm_nodes_follow_profile_node_affinity(tmp_path, make_factory):
+    # the Spot nodegroups are cheaper, but carry the "-spot" label the profile does not select
+    factory = make_warm_factory(make_factory, tmp_path, { 'm5-large' : { 9 : 2 } })
+    factory.process_groups()
+    actions = factory.warm_capacity_schedule['scheduledActions']
+    assert set([action['nodegroup'] for action in actions]) == { 'm5-large-us-west-2a' }
+
+def test_duplicate_nodegroup_names_are_rejected(tmp_path, make_factory):
+    factory = make_warm_factory(make_factory, tmp_path, {})
+    del factory.groups[1]['nodegroupOverrides']['name']
+    with pytest.raises(Exception, match="Nodegroup names must be unique"):
+        factory.process_groups()
+
+def test_scaling_schedule_uses_scheduled_action_inputs():
+    hourly_nodes = [0] * 24
+    hourly_nodes[9] = 1
+    static_sizes, actions = make_scaling_schedule({ 'm5-large-us-west-2a' : hourly_nodes }, { 'm5-large-us-west-2a' : 0 })
+    assert static_sizes == { 'm5-large-us-west-2a' : 0 }
+    assert actions == [
+        { 'nodegroup' : 'm5-large-us-west-2a', 'ScheduledActionName' : 'aws-hub-warm-09', 'Recurrence' : '0 9 * * *', 'MinSize' : 1 },
+        { 'nodegroup' : 'm5-large-us-west-2a', 'ScheduledActionName' : 'aws-hub-warm-10', 'Recurrence' : '0 10 * * *', 'MinSize' : 0 },
+    ]
+
+class fakeAutoScalingClient():
+    def __init__(self):
+        self.deleted = []
+        self.put = []
+
+    def get_paginator(self, operation):
+        client = self
+        class paginator():
+            def paginate(self, **kwargs):
+                if operation == 'describe_auto_scaling_groups':
+                    return [{ 'AutoScalingGroups' : [
+                        { 'AutoScalingGroupName' : 'eksctl-test-nodegroup-m5-large-us-west-2a-NodeGroup-ABC', 'Tags' : [
+                            { 'Key' : 'alpha.eksctl.io/cluster-name', 'Value' : 'test' },
+                            { 'Key' : 'alpha.eksctl.io/nodegroup-name', 'Value' : 'm5-large-us-west-2a' },
+                        ] },
+                        # warm in an earlier plan, but not in the one being applied
+                        { 'AutoScalingGroupName' : 'eksctl-test-nodegroup-i3-large-us-west-2a-NodeGroup-DEF', 'Tags' : [
+                            { 'Key' : 'alpha.eksctl.io/cluster-name', 'Value' : 'test' },
+                            { 'Key' : 'alpha.eksctl.io/nodegroup-name', 'Value' : 'i3-large-us-west-2a' },
+                        ] },
+                        { 'AutoScalingGroupName' : 'eksctl-other-nodegroup-m5-large-us-west-2a-NodeGroup-GHI', 'Tags' : [
+                            { 'Key' : 'alpha.eksctl.io/cluster-name', 'Value' : 'other' },
+                            { 'Key' : 'alpha.eksctl.io/nodegroup-name', 'Value' : 'm5-large-us-west-2a' },
+                        ] },
+                    ] }]
+                return [{ 'ScheduledUpdateGroupActions' : [
+                    { 'ScheduledActionName' : 'aws-hub-warm-03' },
+                    { 'ScheduledActionName' : 'someone-elses-action' },
+                ] }]
+        return paginator()
+
+    def delete_scheduled_action(self, **kwargs):
+        self.deleted.append((kwargs['AutoScalingGroupName'], kwargs['ScheduledActionName']))
+
+    def put_scheduled_update_group_action(self, **kwargs):
+        self.put.append(kwargs)
+
+def test_apply_scaling_schedule_targets_auto_scaling_groups(monkeypatch):
+    from aws_hub import warm_capacity
+    client = fakeAutoScalingClient()
+    monkeypatch.setattr(warm_capacity, "make_boto3_client", lambda client_type, region : client)
+    schedule = { 'clusterName' : 'test', 'region' : 'us-west-2', 'scheduledActions' : [
+        { 'nodegroup' : 'm5-large-us-west-2a', 'ScheduledActionName' : 'aws-hub-warm-09', 'Recurrence' : '0 9 * * *', 'MinSize' : 1 },
+    ] }
+    warm_capacity.apply_scaling_schedule(schedule)
+    assert client.deleted == [
+        ('eksctl-test-nodegroup-i3-large-us-west-2a-NodeGroup-DEF', 'aws-hub-warm-03'),
+        ('eksctl-test-nodegroup-m5-large-us-west-2a-NodeGroup-ABC', 'aws-hub-warm-03'),
+    ]
+    assert client.put == [{
+        'AutoScalingGroupName' : 'eksctl-test-nodegroup-m5-large-us-west-2a-NodeGroup-ABC',
+        'ScheduledActionName' : 'aws-hub-warm-09',
+        'Recurrence' : '0 9 * * *',
+        'MinSize' : 1,
+    }]